@@ -3,17 +3,20 @@ from datetime import datetime, timedelta
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import literal, or_, select, union_all, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload, selectinload
 
 from ..auth.oidc import require_user, UserInfo
-from ..auth.permissions import check_network_permission, require_system_admin
+from ..auth.permissions import get_db_user, network_permission_exists, require_system_admin
 from ..database import get_session
 from ..models import AccessGrant, User, Network, Node
 from ..services.audit import get_client_ip, log_audit
+from ..utils.timeutils import request_now
 
-router = APIRouter(prefix="/api/access-grants", tags=["access-grants"])
+router = APIRouter(prefix="/api/access-grants", tags=["access-grants"], default_response_class=ORJSONResponse)
 
 
 class AccessGrantCreate(BaseModel):
@@ -33,9 +36,9 @@ class AccessGrantResponse(BaseModel):
     resource_name: str
     granted_by_user_id: int
     granted_by_email: Optional[str]
-    expires_at: str
-    created_at: str
-    revoked_at: Optional[str] = None
+    expires_at: datetime
+    created_at: datetime
+    revoked_at: Optional[datetime] = None
     reason: Optional[str]
 
     class Config:
@@ -53,17 +56,22 @@ async def create_access_grant(
     Grant temporary access to a system admin for a resource.
     Only network owners can grant access to their resources.
     """
-    # Get user's database record
-    user_result = await session.execute(select(User).where(User.oidc_sub == user.sub))
-    db_user = user_result.scalar_one_or_none()
+    # Get user's database record and the admin user in a single query
+    # (an AsyncSession cannot run the two lookups concurrently)
+    users_result = await session.execute(
+        select(User).where(or_(User.oidc_sub == user.sub, User.id == body.admin_user_id))
+    )
+    db_user = admin_user = None
+    for row in users_result.scalars():
+        if row.oidc_sub == user.sub:
+            db_user = row
+        if row.id == body.admin_user_id:
+            admin_user = row
+    request.state.db_user = db_user
     
     if not db_user:
         raise HTTPException(status_code=403, detail="User not found")
     
-    # Get admin user
-    admin_result = await session.execute(select(User).where(User.id == body.admin_user_id))
-    admin_user = admin_result.scalar_one_or_none()
-    
     if not admin_user:
         raise HTTPException(status_code=404, detail="Admin user not found")
     
@@ -74,36 +82,38 @@ async def create_access_grant(
     if body.resource_type not in ("network", "node"):
         raise HTTPException(status_code=400, detail="Invalid resource type")
     
-    # Check permission based on resource type
+    # Check permission based on resource type (ownership and resource name in one query)
     if body.resource_type == "network":
         # Check if user is network owner
-        has_permission = await check_network_permission(
-            db_user.id, body.resource_id, "owner", session
+        check_result = await session.execute(
+            select(
+                network_permission_exists(db_user.id, body.resource_id, "owner").label("has_permission"),
+                select(Network.name).where(Network.id == body.resource_id).scalar_subquery().label("name"),
+            )
         )
-        if not has_permission:
+        check = check_result.one()
+        if not check.has_permission:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Only network owners can grant access to networks"
             )
-        
-        # Get network name
-        network_result = await session.execute(select(Network).where(Network.id == body.resource_id))
-        resource = network_result.scalar_one_or_none()
-        if not resource:
+        if check.name is None:
             raise HTTPException(status_code=404, detail="Network not found")
-        resource_name = resource.name
+        resource_name = check.name
         
     elif body.resource_type == "node":
-        # Get node and check network permission
-        node_result = await session.execute(select(Node).where(Node.id == body.resource_id))
-        node = node_result.scalar_one_or_none()
+        # Get node and check permission on its network
+        node_result = await session.execute(
+            select(
+                Node.hostname,
+                network_permission_exists(db_user.id, Node.network_id, "owner").label("has_permission"),
+            ).where(Node.id == body.resource_id)
+        )
+        node = node_result.one_or_none()
         if not node:
             raise HTTPException(status_code=404, detail="Node not found")
         
-        has_permission = await check_network_permission(
-            db_user.id, node.network_id, "owner", session
-        )
-        if not has_permission:
+        if not node.has_permission:
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Only network owners can grant access to nodes"
@@ -111,7 +121,7 @@ async def create_access_grant(
         resource_name = node.hostname
     
     # Create access grant
-    expires_at = datetime.utcnow() + timedelta(hours=body.duration_hours)
+    expires_at = request_now(request) + timedelta(hours=body.duration_hours)
     
     grant = AccessGrant(
         admin_user_id=body.admin_user_id,
@@ -122,8 +132,8 @@ async def create_access_grant(
         reason=body.reason,
     )
     session.add(grant)
+    # flush assigns the id; created_at is a client-side default already set on the object
     await session.flush()
-    await session.refresh(grant)
     await log_audit(
         session,
         "access_grant_created",
@@ -144,15 +154,16 @@ async def create_access_grant(
         resource_name=resource_name,
         granted_by_user_id=grant.granted_by_user_id,
         granted_by_email=db_user.email,
-        expires_at=grant.expires_at.isoformat() if grant.expires_at else "",
-        created_at=grant.created_at.isoformat() if grant.created_at else "",
-        revoked_at=grant.revoked_at.isoformat() if grant.revoked_at else None,
+        expires_at=grant.expires_at,
+        created_at=grant.created_at,
+        revoked_at=grant.revoked_at,
         reason=grant.reason,
     )
 
 
 @router.get("", response_model=list[AccessGrantResponse])
 async def list_access_grants(
+    request: Request,
     active_only: bool = True,
     user: UserInfo = Depends(require_user),
     session: AsyncSession = Depends(get_session),
@@ -163,14 +174,17 @@ async def list_access_grants(
     System admins see grants for them.
     """
     # Get user's database record
-    user_result = await session.execute(select(User).where(User.oidc_sub == user.sub))
-    db_user = user_result.scalar_one_or_none()
+    db_user = await get_db_user(request, session, user)
     
     if not db_user:
         return []
     
-    # Build query
-    stmt = select(AccessGrant)
+    # Build query; users are eager-loaded and any other lazy load fails fast
+    stmt = select(AccessGrant).options(
+        selectinload(AccessGrant.admin_user),
+        selectinload(AccessGrant.granted_by_user),
+        raiseload("*"),
+    )
     
     if user.system_role == "system-admin":
         # System admins see grants for them
@@ -180,7 +194,7 @@ async def list_access_grants(
         stmt = stmt.where(AccessGrant.granted_by_user_id == db_user.id)
     
     if active_only:
-        now = datetime.utcnow()
+        now = request_now(request)
         stmt = stmt.where(
             AccessGrant.revoked_at.is_(None),
             AccessGrant.expires_at > now
@@ -190,28 +204,39 @@ async def list_access_grants(
     
     result = await session.execute(stmt)
     grants = result.scalars().all()
-    
+    if not grants:
+        return []
+
+    # Resource type is polymorphic, so resolve network and node names in one UNION ALL
+    network_ids = {g.resource_id for g in grants if g.resource_type == "network"}
+    node_ids = {g.resource_id for g in grants if g.resource_type != "network"}
+    name_queries = []
+    if network_ids:
+        name_queries.append(
+            select(Network.id.label("id"), literal("network").label("t"), Network.name.label("n"))
+            .where(Network.id.in_(network_ids))
+        )
+    if node_ids:
+        name_queries.append(
+            select(Node.id.label("id"), literal("node").label("t"), Node.hostname.label("n"))
+            .where(Node.id.in_(node_ids))
+        )
+    names_result = await session.execute(
+        union_all(*name_queries) if len(name_queries) > 1 else name_queries[0]
+    )
+    resource_names = {(row.t, row.id): row.n for row in names_result}
+
     responses = []
     for grant in grants:
-        # Get admin user
-        admin_result = await session.execute(select(User).where(User.id == grant.admin_user_id))
-        admin_user = admin_result.scalar_one_or_none()
-        
-        # Get granter user
-        granter_result = await session.execute(select(User).where(User.id == grant.granted_by_user_id))
-        granter_user = granter_result.scalar_one_or_none()
-        
+        admin_user = grant.admin_user
+        granter_user = grant.granted_by_user
+
         # Get resource name
-        if grant.resource_type == "network":
-            resource_result = await session.execute(select(Network).where(Network.id == grant.resource_id))
-            resource = resource_result.scalar_one_or_none()
-            resource_name = resource.name if resource else "Unknown"
-        else:
-            resource_result = await session.execute(select(Node).where(Node.id == grant.resource_id))
-            resource = resource_result.scalar_one_or_none()
-            resource_name = resource.hostname if resource else "Unknown"
+        resource_key = ("network" if grant.resource_type == "network" else "node", grant.resource_id)
+        resource_name = resource_names.get(resource_key, "Unknown")
         
-        responses.append(AccessGrantResponse(
+        # Values come straight from the DB rows, so skip per-field validation
+        responses.append(AccessGrantResponse.model_construct(
             id=grant.id,
             admin_user_id=grant.admin_user_id,
             admin_email=admin_user.email if admin_user else None,
@@ -220,9 +245,9 @@ async def list_access_grants(
             resource_name=resource_name,
             granted_by_user_id=grant.granted_by_user_id,
             granted_by_email=granter_user.email if granter_user else None,
-            expires_at=grant.expires_at.isoformat() if grant.expires_at else "",
-            created_at=grant.created_at.isoformat() if grant.created_at else "",
-            revoked_at=grant.revoked_at.isoformat() if grant.revoked_at else None,
+            expires_at=grant.expires_at,
+            created_at=grant.created_at,
+            revoked_at=grant.revoked_at,
             reason=grant.reason,
         ))
     
@@ -238,34 +263,46 @@ async def revoke_access_grant(
 ):
     """Revoke an access grant. Only the granter can revoke."""
     # Get user's database record
-    user_result = await session.execute(select(User).where(User.oidc_sub == user.sub))
-    db_user = user_result.scalar_one_or_none()
+    db_user = await get_db_user(request, session, user)
     
     if not db_user:
         raise HTTPException(status_code=403, detail="User not found")
     
-    # Get grant
-    grant_result = await session.execute(select(AccessGrant).where(AccessGrant.id == grant_id))
-    grant = grant_result.scalar_one_or_none()
-    
-    if not grant:
-        raise HTTPException(status_code=404, detail="Access grant not found")
+    # Revoke in a single UPDATE; the granter check is part of the WHERE clause
+    revoke_result = await session.execute(
+        update(AccessGrant)
+        .where(
+            AccessGrant.id == grant_id,
+            AccessGrant.granted_by_user_id == db_user.id,
+            AccessGrant.revoked_at.is_(None),
+        )
+        .values(revoked_at=request_now(request))
+        .returning(AccessGrant.resource_type, AccessGrant.resource_id)
+    )
+    revoked = revoke_result.one_or_none()
     
-    # Check permission (only granter can revoke)
-    if grant.granted_by_user_id != db_user.id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Only the granter can revoke this access"
+    if revoked is None:
+        # Nothing updated: find out why (only on this error path)
+        grant_result = await session.execute(
+            select(AccessGrant.granted_by_user_id).where(AccessGrant.id == grant_id)
         )
+        granted_by_user_id = grant_result.scalar_one_or_none()
+        if granted_by_user_id is None:
+            raise HTTPException(status_code=404, detail="Access grant not found")
+        # Check permission (only granter can revoke)
+        if granted_by_user_id != db_user.id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only the granter can revoke this access"
+            )
+        # Already revoked
+        return None
     
-    # Revoke grant
-    grant.revoked_at = datetime.utcnow()
-    await session.flush()
     await log_audit(
         session,
         "access_grant_revoked",
-        resource_type=grant.resource_type,
-        resource_id=grant.resource_id,
+        resource_type=revoked.resource_type,
+        resource_id=revoked.resource_id,
         actor_user_id=db_user.id,
         actor_identifier=db_user.email or user.sub,
         client_ip=get_client_ip(request),
@@ -2,18 +2,18 @@
 from datetime import datetime
 from typing import Optional
 
+import orjson
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from pydantic import BaseModel
 from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
 from ..auth.oidc import UserInfo
 from ..auth.permissions import require_system_admin
-from ..database import get_session
+from ..database import AsyncSessionLocal
 from ..models.db import AuditLog, User
 
-router = APIRouter(prefix="/api/audit", tags=["audit"])
+router = APIRouter(prefix="/api/audit", tags=["audit"], default_response_class=ORJSONResponse)
 
 
 class AuditEntryResponse(BaseModel):
@@ -36,7 +36,6 @@ class AuditEntryResponse(BaseModel):
 @router.get("", response_model=list[AuditEntryResponse])
 async def list_audit_logs(
     _admin: UserInfo = Depends(require_system_admin),
-    session: AsyncSession = Depends(get_session),
     limit: int = Query(50, ge=1, le=200),
     offset: int = Query(0, ge=0),
     action: Optional[str] = Query(None),
@@ -44,8 +43,26 @@ async def list_audit_logs(
     from_date: Optional[datetime] = Query(None),
     to_date: Optional[datetime] = Query(None),
 ):
-    """List audit log entries (system admins only). Ordered by occurred_at descending."""
-    q = select(AuditLog).options(selectinload(AuditLog.actor_user))
+    """
+    List audit log entries (system admins only). Ordered by occurred_at descending.
+    Rows are streamed to the client as a JSON array while they are read from the database.
+    """
+    q = (
+        select(
+            AuditLog.id,
+            AuditLog.occurred_at,
+            AuditLog.action,
+            AuditLog.actor_user_id,
+            AuditLog.actor_identifier,
+            User.email.label("actor_email"),
+            AuditLog.resource_type,
+            AuditLog.resource_id,
+            AuditLog.result,
+            AuditLog.details,
+            AuditLog.client_ip,
+        )
+        .outerjoin(User, User.id == AuditLog.actor_user_id)
+    )
     if action is not None:
         q = q.where(AuditLog.action == action)
     if resource_type is not None:
@@ -55,22 +72,18 @@ async def list_audit_logs(
     if to_date is not None:
         q = q.where(AuditLog.occurred_at <= to_date)
     q = q.order_by(AuditLog.occurred_at.desc()).offset(offset).limit(limit)
-    result = await session.execute(q)
-    rows = result.scalars().all()
 
-    return [
-        AuditEntryResponse(
-            id=row.id,
-            occurred_at=row.occurred_at,
-            action=row.action,
-            actor_user_id=row.actor_user_id,
-            actor_identifier=row.actor_identifier,
-            actor_email=row.actor_user.email if row.actor_user else None,
-            resource_type=row.resource_type,
-            resource_id=row.resource_id,
-            result=row.result,
-            details=row.details,
-            client_ip=row.client_ip,
-        )
-        for row in rows
-    ]
+    async def stream_entries():
+        # Own session: the request-scoped one is closed before a streamed body is sent
+        async with AsyncSessionLocal() as session:
+            result = await session.stream(q)
+            yield b"["
+            first = True
+            async for row in result.mappings():
+                if not first:
+                    yield b","
+                first = False
+                yield orjson.dumps(dict(row))
+            yield b"]"
+
+    return StreamingResponse(stream_entries(), media_type="application/json")
@@ -1,35 +1,71 @@
 """Auth API: login and dev token for development."""
-import base64
-import json
+import asyncio
 import logging
-from datetime import datetime, timedelta
+import time
 from typing import Optional
-from urllib.parse import urlencode, urlparse
+from urllib.parse import quote_plus, urlencode, urlparse
 
 import httpx
+import jwt
 from authlib.integrations.starlette_client import OAuth
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import RedirectResponse
+from fastapi.responses import ORJSONResponse, RedirectResponse
 from pydantic import BaseModel
 from starlette.config import Config
 
 from ..config import settings
-from ..auth.oidc import get_current_user_optional, require_user, UserInfo
+from ..auth.oidc import forget_decoded_token, get_current_user_optional, require_user, UserInfo
 from ..auth.reauth import create_reauth_challenge, mark_reauth_completed, create_reauth_token
+from ..auth.tokens import encode_token
 from ..database import get_session
 from ..models.db import User
-from ..services.audit import get_client_ip, log_audit
-from jose import jwt
+from ..services.audit import enqueue_audit, get_client_ip, log_audit
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/auth", tags=["auth"])
+router = APIRouter(prefix="/api/auth", tags=["auth"], default_response_class=ORJSONResponse)
 
 # OAuth client setup
 oauth = OAuth()
 
+# Static parts of the OIDC logout / reauth query strings (settings do not change at runtime)
+_LOGOUT_STATIC_PARAMS = urlencode({'client_id': settings.oidc_client_id})
+_REAUTH_STATIC_PARAMS = urlencode({
+    'client_id': settings.oidc_client_id,
+    'response_type': 'code',
+    'scope': settings.oidc_scopes,
+    'prompt': 'login',  # Force reauthentication
+})
+# Browser-facing Keycloak authorize URL including the static reauth params
+_REAUTH_URL_PREFIX = f"{settings.oidc_authorize_url}?{_REAUTH_STATIC_PARAMS}"
+
+# Keycloak client role -> system role, highest precedence first
+_ROLE_PRIORITY = (
+    ("system-admin", "system-admin"),
+)
+
+
+# Redirect whitelist as a set for O(1) host checks (settings do not change at runtime)
+_ALLOWED_REDIRECT_HOSTS = frozenset(settings.allowed_redirect_hosts or ())
+
+
+def _base_from_oidc() -> Optional[str]:
+    """Frontend base URL (scheme + host) derived from the OIDC redirect URI, if set."""
+    if not settings.oidc_redirect_uri:
+        return None
+    parsed = urlparse(settings.oidc_redirect_uri)
+    return f"{parsed.scheme}://{parsed.netloc}"
+
+
+_OIDC_BASE_URL = _base_from_oidc()
+
+
+def _request_host(request: Request) -> str:
+    """Host header, falling back to the URL netloc (request.url is only built when needed)."""
+    return request.headers.get("host") or request.url.netloc
+
 
 def get_safe_redirect_url(request: Request) -> str:
     """
@@ -43,19 +79,19 @@ def get_safe_redirect_url(request: Request) -> str:
     Returns the frontend base URL (scheme + host).
     """
     # Primary source: derive from OIDC redirect URI
-    if settings.oidc_redirect_uri:
-        parsed = urlparse(settings.oidc_redirect_uri)
-        base_url = f"{parsed.scheme}://{parsed.netloc}"
-        return base_url
+    if _OIDC_BASE_URL:
+        return _OIDC_BASE_URL
     
     # Secondary: check if we have an allowed hosts whitelist
-    if settings.allowed_redirect_hosts:
-        request_host = request.headers.get("host", request.url.netloc)
+    if _ALLOWED_REDIRECT_HOSTS:
+        request_host = _request_host(request)
         
-        # Validate request host against whitelist
-        for allowed_host in settings.allowed_redirect_hosts:
-            if request_host == allowed_host or request_host.startswith(f"{allowed_host}:"):
-                return f"{request.url.scheme}://{request_host}"
+        # Validate request host (with or without port) against whitelist
+        if (
+            request_host in _ALLOWED_REDIRECT_HOSTS
+            or request_host.rpartition(":")[0] in _ALLOWED_REDIRECT_HOSTS
+        ):
+            return f"{request.url.scheme}://{request_host}"
         
         # Host not in whitelist - use first allowed host as fallback
         logger.warning(
@@ -66,7 +102,7 @@ def get_safe_redirect_url(request: Request) -> str:
     
     # Fallback: use request host (less secure, but maintains backward compatibility)
     # This should only happen in development when OIDC is not configured
-    request_host = request.headers.get("host", request.url.netloc)
+    request_host = _request_host(request)
     logger.warning(
         "No redirect validation configured (oidc_redirect_uri or allowed_redirect_hosts empty), "
         "using request host: %s",
@@ -75,28 +111,169 @@ def get_safe_redirect_url(request: Request) -> str:
     return f"{request.url.scheme}://{request_host}"
 
 
-def get_oauth_client():
-    """Get or create OAuth client for OIDC."""
+class _SharedTransport(httpx.AsyncHTTPTransport):
+    """
+    Keep-alive connection pool shared by every HTTP client talking to the OIDC provider.
+    Authlib opens and closes a client per call; closing those clients must not close
+    the shared pool, so only close_pool() (on shutdown) really closes it.
+    """
+
+    async def __aexit__(self, *args) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass
+
+    async def close_pool(self) -> None:
+        await super().aclose()
+
+
+_oidc_transport = _SharedTransport(
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=100)
+)
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    """Dependency: app-wide HTTP client for calls to the OIDC provider (pooled connections)."""
+    return request.app.state.http_client
+
+
+# Cached OIDC discovery document (plus its JWKS under "jwks"); refreshed after the TTL
+_OIDC_METADATA_TTL_SECONDS = 24 * 3600
+_OIDC_METADATA_RETRY_SECONDS = 60
+_oidc_metadata: dict = {}
+_oidc_metadata_fetched_at: float = 0.0
+
+
+async def _load_oidc_metadata(force: bool = False) -> dict:
+    """
+    Fetch the OIDC discovery document and JWKS, caching them in-process.
+    Returns the cached copy while it is younger than the TTL unless force is set.
+    """
+    global _oidc_metadata, _oidc_metadata_fetched_at
+    now = time.monotonic()
+    if _oidc_metadata and not force and now - _oidc_metadata_fetched_at < _OIDC_METADATA_TTL_SECONDS:
+        return _oidc_metadata
+
+    # Use public issuer URL for discovery when set so the browser redirect (login)
+    # goes to the correct host:port; otherwise use internal issuer URL.
+    issuer_for_discovery = settings.oidc_public_issuer_url or settings.oidc_issuer_url
+    well_known_url = f"{issuer_for_discovery.rstrip('/')}/.well-known/openid-configuration"
+    async with httpx.AsyncClient(transport=_oidc_transport, timeout=10.0) as http:
+        r = await http.get(well_known_url)
+        r.raise_for_status()
+        metadata = r.json()
+        jwks_uri = metadata.get("jwks_uri")
+        if jwks_uri:
+            r = await http.get(jwks_uri)
+            r.raise_for_status()
+            metadata["jwks"] = r.json()
+
+    _oidc_metadata = metadata
+    _oidc_metadata_fetched_at = now
+    return metadata
+
+
+def _oidc_metadata_fresh() -> bool:
+    return bool(_oidc_metadata) and time.monotonic() - _oidc_metadata_fetched_at < _OIDC_METADATA_TTL_SECONDS
+
+
+# Serializes (re-)registration so concurrent requests never register the client twice
+_oauth_lock = asyncio.Lock()
+
+
+async def _register_oauth_client(force: bool = False):
+    """
+    Register the Authlib client with the cached discovery metadata (caller holds _oauth_lock).
+
+    The metadata is passed directly instead of server_metadata_url, so Authlib does
+    not fetch it again. Authlib refreshes the JWKS by itself when an ID token carries
+    an unknown kid. Returns None when no metadata could be loaded.
+    """
+    try:
+        metadata = await _load_oidc_metadata(force=force)
+    except Exception as e:
+        if not _oidc_metadata:
+            logger.warning("Failed to load OIDC metadata: %s", e)
+            return None
+        # Keep serving the last known metadata while the provider is unreachable,
+        # and wait a minute before the next refresh attempt
+        logger.warning("Failed to refresh OIDC metadata, using cached copy: %s", e)
+        global _oidc_metadata_fetched_at
+        _oidc_metadata_fetched_at = time.monotonic() - _OIDC_METADATA_TTL_SECONDS + _OIDC_METADATA_RETRY_SECONDS
+        if hasattr(oauth, 'keycloak'):
+            return oauth.keycloak
+        metadata = _oidc_metadata
+    oauth.register(
+        name='keycloak',
+        overwrite=True,
+        client_id=settings.oidc_client_id,
+        client_secret=settings.oidc_client_secret,
+        client_kwargs={
+            'scope': settings.oidc_scopes,
+            'transport': _oidc_transport,
+            'timeout': 10.0,
+        },
+        **metadata,
+    )
+    return oauth.keycloak
+
+
+async def _refresh_oauth_client_periodically(app) -> None:
+    """Re-fetch OIDC metadata and JWKS every TTL so requests never wait on discovery."""
+    while True:
+        await asyncio.sleep(_OIDC_METADATA_TTL_SECONDS)
+        async with _oauth_lock:
+            client = await _register_oauth_client(force=True)
+            if client is not None:
+                app.state.oauth_client = client
+
+
+async def init_oauth_client(app) -> None:
+    """
+    Create the shared HTTP client, register the OIDC client once at startup,
+    keep both on app.state and start the background metadata refresher.
+    """
+    app.state.http_client = httpx.AsyncClient(transport=_oidc_transport, timeout=15.0)
+    app.state.oauth_client = None
+    app.state.oauth_refresh_task = None
+    if not settings.oidc_issuer_url:
+        return
+    async with _oauth_lock:
+        app.state.oauth_client = await _register_oauth_client()
+    app.state.oauth_refresh_task = asyncio.create_task(_refresh_oauth_client_periodically(app))
+
+
+async def shutdown_oauth_client(app) -> None:
+    """Stop the metadata refresher and close the shared HTTP client and connection pool."""
+    task = getattr(app.state, "oauth_refresh_task", None)
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await app.state.http_client.aclose()
+    await _oidc_transport.close_pool()
+
+
+async def get_oauth_client(request: Request):
+    """
+    Get the OAuth client for OIDC registered at startup.
+    Re-registers when the cached metadata has expired or the startup fetch failed.
+    """
     if not settings.oidc_issuer_url:
         return None
-    
-    # Register OAuth client if not already registered
-    if not hasattr(oauth, 'keycloak'):
-        # Use public issuer URL for discovery when set so the browser redirect (login)
-        # goes to the correct host:port; otherwise use internal issuer URL.
-        issuer_for_discovery = settings.oidc_public_issuer_url or settings.oidc_issuer_url
-        well_known_url = f"{issuer_for_discovery.rstrip('/')}/.well-known/openid-configuration"
-
-        oauth.register(
-            name='keycloak',
-            client_id=settings.oidc_client_id,
-            client_secret=settings.oidc_client_secret,
-            server_metadata_url=well_known_url,
-            client_kwargs={
-                'scope': settings.oidc_scopes,
-            }
-        )
-    return oauth.keycloak
+
+    client = getattr(request.app.state, "oauth_client", None)
+    if client is not None and _oidc_metadata_fresh():
+        return client
+    async with _oauth_lock:
+        client = getattr(request.app.state, "oauth_client", None)
+        if client is None or not _oidc_metadata_fresh():
+            client = await _register_oauth_client() or client
+            request.app.state.oauth_client = client
+    return client
 
 
 class DevTokenResponse(BaseModel):
@@ -108,7 +285,6 @@ class DevTokenResponse(BaseModel):
 async def dev_token(
     request: Request,
     user: Optional[UserInfo] = Depends(get_current_user_optional),
-    session: AsyncSession = Depends(get_session),
 ):
     """
     Return a JWT for development when debug is enabled or when OIDC is not configured.
@@ -129,7 +305,7 @@ async def dev_token(
         "DEV-TOKEN accessed from %s - granting admin access without authentication",
         request.client.host if request.client else "unknown"
     )
-    expires = datetime.utcnow() + timedelta(minutes=settings.jwt_expiration_minutes)
+    expires = int(time.time()) + settings.jwt_expiration_seconds
     payload = {
         "sub": "dev",
         "email": "dev@localhost",
@@ -137,21 +313,15 @@ async def dev_token(
         "system_role": "system-admin",
         "exp": expires,
     }
-    token = jwt.encode(
-        payload,
-        settings.jwt_secret_key,
-        algorithm=settings.jwt_algorithm,
-    )
-    await log_audit(
-        session,
+    token = encode_token(payload)
+    enqueue_audit(
         "auth_dev_token",
         actor_identifier="dev",
         client_ip=get_client_ip(request),
     )
-    await session.commit()
     return DevTokenResponse(
         token=token,
-        expires_in=settings.jwt_expiration_minutes * 60,
+        expires_in=settings.jwt_expiration_seconds,
     )
 
 
@@ -181,7 +351,7 @@ async def login(request: Request):
             detail="OIDC not configured. Use /api/auth/dev-token for development."
         )
     
-    client = get_oauth_client()
+    client = await get_oauth_client(request)
     if not client:
         raise HTTPException(status_code=500, detail="OAuth client not initialized")
     
@@ -199,13 +369,9 @@ async def oidc_status():
         # OIDC not configured; treat as "disabled" rather than an error
         return {"status": "disabled"}
 
-    client = get_oauth_client()
-    if not client:
-        raise HTTPException(status_code=500, detail="OAuth client not initialized")
-
     try:
-        # Force metadata load; this is where we currently see RemoteProtocolError when Keycloak is down.
-        await client.load_server_metadata()
+        # Re-fetch metadata so the check reflects the provider's current availability.
+        await _load_oidc_metadata(force=True)
         return {"status": "ok"}
     except Exception as exc:  # pragma: no cover - defensive catch for transport errors
         logger.warning("OIDC status check failed: %s", exc)
@@ -221,7 +387,7 @@ async def callback(request: Request, session: AsyncSession = Depends(get_session
     if not settings.oidc_issuer_url:
         raise HTTPException(status_code=501, detail="OIDC not configured")
     
-    client = get_oauth_client()
+    client = await get_oauth_client(request)
     if not client:
         raise HTTPException(status_code=500, detail="OAuth client not initialized")
     
@@ -240,44 +406,44 @@ async def callback(request: Request, session: AsyncSession = Depends(get_session
             else:
                 # Fetch from userinfo endpoint
                 user_info = await client.userinfo(token=token)
+        oidc_sub = user_info.get("sub")
+        claimed_email = user_info.get("email")
+        preferred_username = user_info.get("preferred_username")
         
         # Extract roles from Keycloak token
         resource_access = user_info.get("resource_access", {})
         client_roles = resource_access.get(settings.oidc_client_id, {}).get("roles", [])
         
         # Map to system role (only system-admin is elevated; network ownership is per-network in backend)
-        system_role = "user"  # default
-        if "system-admin" in client_roles:
-            system_role = "system-admin"
+        role_set = set(client_roles)
+        system_role = next(
+            (mapped for kc_role, mapped in _ROLE_PRIORITY if kc_role in role_set),
+            "user",
+        )
         
         # Create our own JWT for the frontend
-        expires = datetime.utcnow() + timedelta(minutes=settings.jwt_expiration_minutes)
+        expires = int(time.time()) + settings.jwt_expiration_seconds
         payload = {
-            "sub": user_info.get("sub"),
-            "email": user_info.get("email"),
-            "name": user_info.get("name", user_info.get("preferred_username")),
+            "sub": oidc_sub,
+            "email": claimed_email,
+            "name": user_info.get("name", preferred_username),
             "role": system_role,  # Legacy field for backward compatibility
             "system_role": system_role,
             "exp": expires,
         }
         
-        our_token = jwt.encode(
-            payload,
-            settings.jwt_secret_key,
-            algorithm=settings.jwt_algorithm,
-        )
+        our_token = encode_token(payload)
         
         # Get or create user and log login success
-        oidc_sub = user_info.get("sub")
-        email = user_info.get("email") or user_info.get("preferred_username") or "unknown"
+        email = claimed_email or preferred_username or "unknown"
         user_result = await session.execute(select(User).where(User.oidc_sub == oidc_sub))
         db_user = user_result.scalar_one_or_none()
         if not db_user:
             db_user = User(oidc_sub=oidc_sub, email=email, system_role=system_role)
             session.add(db_user)
-            await session.flush()
-        await log_audit(
-            session,
+            # Commit before queueing the audit entry that references the new user
+            await session.commit()
+        enqueue_audit(
             "auth_login_success",
             resource_type="user",
             resource_id=db_user.id,
@@ -285,7 +451,6 @@ async def callback(request: Request, session: AsyncSession = Depends(get_session
             actor_identifier=email,
             client_ip=client_ip,
         )
-        await session.commit()
         
         # Redirect to frontend with token in URL query params
         # Use validated redirect URL to prevent open redirect attacks
@@ -294,11 +459,9 @@ async def callback(request: Request, session: AsyncSession = Depends(get_session
         
         return RedirectResponse(url=redirect_url)
         
-    except Exception as e:
+    except Exception:
         # Log error and redirect to login with error
-        print(f"OAuth callback error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("OAuth callback error")
         await log_audit(
             session,
             "auth_login_failure",
@@ -315,18 +478,20 @@ async def callback(request: Request, session: AsyncSession = Depends(get_session
 
 
 @router.get("/logout")
-async def logout(request: Request, session: AsyncSession = Depends(get_session)):
+async def logout(request: Request):
     """
     Logout from OIDC provider (Keycloak) and clear session.
     Redirects to Keycloak logout endpoint.
     """
-    await log_audit(
-        session,
+    # Stop reusing a cached validation of the caller's bearer token, if one was sent
+    scheme, _, bearer = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and bearer:
+        forget_decoded_token(bearer)
+    enqueue_audit(
         "auth_logout",
         actor_identifier="unknown",
         client_ip=get_client_ip(request),
     )
-    await session.commit()
     if not settings.oidc_issuer_url:
         # No OIDC, just redirect to frontend
         frontend_url = get_safe_redirect_url(request)
@@ -336,15 +501,9 @@ async def logout(request: Request, session: AsyncSession = Depends(get_session))
     # Format: {issuer}/protocol/openid-connect/logout?post_logout_redirect_uri={frontend}&client_id={client_id}
     frontend_url = get_safe_redirect_url(request)
     
-    # Use public issuer URL if set, otherwise fall back to regular issuer URL
-    issuer_url = settings.oidc_public_issuer_url or settings.oidc_issuer_url
-    
     # Keycloak requires post_logout_redirect_uri (not redirect_uri) and client_id
-    logout_params = urlencode({
-        'post_logout_redirect_uri': frontend_url,
-        'client_id': settings.oidc_client_id,
-    })
-    logout_url = f"{issuer_url}/protocol/openid-connect/logout?{logout_params}"
+    logout_params = f"post_logout_redirect_uri={quote_plus(frontend_url)}&{_LOGOUT_STATIC_PARAMS}"
+    logout_url = f"{settings.oidc_logout_url}?{logout_params}"
     
     return RedirectResponse(url=logout_url)
 
@@ -367,7 +526,7 @@ async def create_reauth(
     
     if not settings.oidc_issuer_url:
         # No OIDC, return a simple challenge (for dev mode)
-        host = request.headers.get("host", request.url.netloc)
+        host = _request_host(request)
         reauth_url = f"{request.url.scheme}://{host}/auth/reauth/complete?challenge={challenge}"
         return ReauthChallengeResponse(
             challenge=challenge,
@@ -377,16 +536,10 @@ async def create_reauth(
     reauth_redirect_uri = _get_reauth_redirect_uri(request)
 
     # Use Keycloak authorize endpoint with prompt=login; challenge is passed as state (not in redirect_uri)
-    issuer_url = settings.oidc_public_issuer_url or settings.oidc_issuer_url
-    auth_params = urlencode({
-        'client_id': settings.oidc_client_id,
-        'redirect_uri': reauth_redirect_uri,
-        'response_type': 'code',
-        'scope': settings.oidc_scopes,
-        'prompt': 'login',  # Force reauthentication
-        'state': challenge,
-    })
-    reauth_url = f"{issuer_url}/protocol/openid-connect/auth?{auth_params}"
+    reauth_url = (
+        f"{_REAUTH_URL_PREFIX}&redirect_uri={quote_plus(reauth_redirect_uri)}"
+        f"&state={quote_plus(challenge)}"
+    )
     
     return ReauthChallengeResponse(
         challenge=challenge,
@@ -405,7 +558,10 @@ def _get_reauth_redirect_uri(request: Request) -> str:
 
 
 @router.get("/reauth/callback")
-async def reauth_callback(request: Request):
+async def reauth_callback(
+    request: Request,
+    http_client: httpx.AsyncClient = Depends(get_http_client),
+):
     """
     Reauthentication callback endpoint. Keycloak redirects here with code and state (our challenge).
     We exchange the code for tokens manually (no authlib session) and validate state ourselves.
@@ -428,24 +584,20 @@ async def reauth_callback(request: Request):
         return RedirectResponse(url=f"{frontend_url}/reauth/complete?error=missing_code")
 
     redirect_uri = _get_reauth_redirect_uri(request)
-    issuer_base = (settings.oidc_public_issuer_url or settings.oidc_issuer_url or "").rstrip("/")
-    token_url = f"{issuer_base}/protocol/openid-connect/token"
-
     try:
-        async with httpx.AsyncClient(timeout=15.0) as http_client:
-            token_response = await http_client.post(
-                token_url,
-                data={
-                    "grant_type": "authorization_code",
-                    "code": code,
-                    "redirect_uri": redirect_uri,
-                    "client_id": settings.oidc_client_id,
-                    "client_secret": settings.oidc_client_secret,
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-            )
-            token_response.raise_for_status()
-            token_data = token_response.json()
+        token_response = await http_client.post(
+            settings.oidc_token_url,
+            data={
+                "grant_type": "authorization_code",
+                "code": code,
+                "redirect_uri": redirect_uri,
+                "client_id": settings.oidc_client_id,
+                "client_secret": settings.oidc_client_secret,
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        token_response.raise_for_status()
+        token_data = token_response.json()
     except Exception as e:
         logger.exception("Reauth token exchange failed: %s", e)
         frontend_url = get_safe_redirect_url(request)
@@ -456,17 +608,13 @@ async def reauth_callback(request: Request):
     id_token = token_data.get("id_token")
     if id_token:
         try:
-            parts = id_token.split(".")
-            if len(parts) >= 2:
-                payload_b64 = parts[1]
-                payload_b64 += "=" * (4 - len(payload_b64) % 4)
-                payload = json.loads(base64.urlsafe_b64decode(payload_b64))
-                user_sub = payload.get("sub")
-        except Exception:
+            payload = jwt.decode(id_token, options={"verify_signature": False})
+            user_sub = payload.get("sub")
+        except jwt.PyJWTError:
             pass
     if not user_sub and token_data.get("access_token"):
         # Fallback: userinfo endpoint
-        client = get_oauth_client()
+        client = await get_oauth_client(request)
         if client:
             try:
                 user_info = await client.userinfo(token=token_data)
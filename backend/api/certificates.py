@@ -4,22 +4,24 @@ from datetime import datetime, timedelta
 from typing import Any, Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
-from pydantic import BaseModel
-from sqlalchemy import func, select
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import and_, exists, func, literal, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from ..auth.oidc import require_user, UserInfo
 from ..config import settings
 from ..database import get_session
 from pathlib import Path
-from ..models import Network, Node, Certificate, User
+from ..models import AllocatedIP, Network, Node, Certificate, User
 from ..services.audit import get_client_ip, log_audit
-from ..services.cert_store import read_cert_store_file
-from ..services.cert_manager import CertManager
-from ..services.ip_allocator import IPAllocator
+from ..services.cert_store import read_cert_store_file_cached
+from ..services.cert_manager import CertManager, get_cert_manager
+from ..utils.timeutils import utcnow
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/certificates", tags=["certificates"])
+router = APIRouter(prefix="/api/certificates", tags=["certificates"], default_response_class=ORJSONResponse)
 
 
 class SignRequest(BaseModel):
@@ -75,25 +77,32 @@ class CertificateListItem(BaseModel):
     revoked_at: Optional[datetime] = None
 
 
+_certificate_list_adapter = TypeAdapter(list[CertificateListItem])
+
+
 @router.post("/sign", response_model=SignResponse)
 async def sign_certificate(
     body: SignRequest,
     request: Request,
     user: UserInfo = Depends(require_user),
     session: AsyncSession = Depends(get_session),
+    cert_manager: CertManager = Depends(get_cert_manager),
 ):
     """
     Sign a host certificate. Client must send the public key (betterkeys).
     Returns assigned IP and signed certificate PEM.
     """
+    # Network and any existing node with this hostname in one query
     result = await session.execute(
-        select(Network).where(Network.id == body.network_id)
+        select(Network, Node)
+        .outerjoin(Node, and_(Node.network_id == Network.id, Node.hostname == body.name))
+        .where(Network.id == body.network_id)
     )
-    network = result.scalar_one_or_none()
-    if not network:
+    row = result.first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Network not found")
+    network, node = row
 
-    cert_manager = CertManager(session)
     duration = body.duration_days or settings.default_cert_expiry_days
     ip, cert_pem = await cert_manager.sign_host(
         network=network,
@@ -104,14 +113,9 @@ async def sign_certificate(
         duration_days=duration,
     )
 
-    # Create or update node and certificate record
-    node_result = await session.execute(
-        select(Node).where(
-            Node.network_id == body.network_id,
-            Node.hostname == body.name,
-        )
-    )
-    node = node_result.scalar_one_or_none()
+    # Create or update node and certificate record; both are written by a single flush
+    expires_at = utcnow() + timedelta(days=duration)
+    cert_record = Certificate(expires_at=expires_at, cert_path=None)
     if not node:
         node = Node(
             network_id=body.network_id,
@@ -120,32 +124,33 @@ async def sign_certificate(
             ip_address=ip,
             status="active",
             groups=[body.group] if (body.group and body.group.strip()) else [],
+            certificates=[cert_record],
         )
         session.add(node)
-        await session.flush()
     else:
         node.ip_address = ip
         node.public_key = body.public_key
         node.groups = [body.group] if (body.group and body.group.strip()) else (node.groups or [])
         node.status = "active"
+        cert_record.node = node
+        session.add(cert_record)
+    try:
         await session.flush()
-
-    expires_at = datetime.utcnow() + timedelta(days=duration)
-    cert_record = Certificate(
-        node_id=node.id,
-        expires_at=expires_at,
-        cert_path=None,
-    )
-    session.add(cert_record)
-    await session.flush()
-    user_result = await session.execute(select(User).where(User.oidc_sub == user.sub))
-    db_user = user_result.scalar_one_or_none()
+    except IntegrityError:
+        # Another request created this hostname concurrently (uq_node_network_hostname)
+        await session.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="A node with this name already exists in this network.",
+        )
+    user_result = await session.execute(select(User.id).where(User.oidc_sub == user.sub))
+    actor_user_id = user_result.scalar_one_or_none()
     await log_audit(
         session,
         "cert_signed",
         resource_type="node",
         resource_id=node.id,
-        actor_user_id=db_user.id if db_user else None,
+        actor_user_id=actor_user_id,
         actor_identifier=user.email or user.sub,
         client_ip=get_client_ip(request),
     )
@@ -153,7 +158,7 @@ async def sign_certificate(
     ca_pem = None
     if network.ca_cert_path:
         try:
-            ca_pem = read_cert_store_file(Path(network.ca_cert_path))
+            ca_pem = read_cert_store_file_cached(Path(network.ca_cert_path))
         except FileNotFoundError:
             logger.warning("CA cert file not found: %s", network.ca_cert_path)
         except PermissionError:
@@ -174,25 +179,43 @@ async def create_certificate(
     request: Request,
     user: UserInfo = Depends(require_user),
     session: AsyncSession = Depends(get_session),
+    cert_manager: CertManager = Depends(get_cert_manager),
 ):
     """
     Create a host certificate. Server generates the keypair, signs it, and returns
     the private key, signed cert, and CA cert. The private key is returned only once;
     copy it to your node securely. Rejects duplicate (network_id, hostname) and reserved suggested_ip.
     """
+    hostname = body.name.strip()
+    suggested_ip = body.suggested_ip.strip() if body.suggested_ip else None
+
+    # Network plus all creation preconditions (node count, duplicate hostname,
+    # reserved suggested IP) in a single query
     result = await session.execute(
-        select(Network).where(Network.id == body.network_id)
+        select(
+            Network,
+            select(func.count(Node.id))
+            .where(Node.network_id == Network.id)
+            .scalar_subquery()
+            .label("node_count"),
+            exists()
+            .where(Node.network_id == Network.id, Node.hostname == hostname)
+            .label("hostname_taken"),
+            (
+                exists()
+                .where(AllocatedIP.network_id == Network.id, AllocatedIP.ip_address == suggested_ip)
+                if suggested_ip
+                else literal(False)
+            ).label("ip_taken"),
+        ).where(Network.id == body.network_id)
     )
-    network = result.scalar_one_or_none()
-    if not network:
+    row = result.first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Network not found")
+    network, node_count, hostname_taken, ip_taken = row
 
     # First node in network must be a lighthouse
-    count_result = await session.execute(
-        select(func.count(Node.id)).where(Node.network_id == body.network_id)
-    )
-    node_count = count_result.scalar() or 0
-    if node_count == 0:
+    if not node_count:
         if body.is_lighthouse is False:
             raise HTTPException(
                 status_code=400,
@@ -204,42 +227,33 @@ async def create_certificate(
         is_lighthouse = body.is_lighthouse if body.is_lighthouse is not None else False
 
     # Reject duplicate node (create-only for network_id + hostname)
-    node_result = await session.execute(
-        select(Node).where(
-            Node.network_id == body.network_id,
-            Node.hostname == body.name.strip(),
-        )
-    )
-    if node_result.scalar_one_or_none() is not None:
+    if hostname_taken:
         raise HTTPException(
             status_code=409,
             detail="A node with this name already exists in this network.",
         )
 
     # Reject reserved suggested IP
-    if body.suggested_ip and body.suggested_ip.strip():
-        ip_allocator = IPAllocator(session)
-        if await ip_allocator.is_allocated(body.network_id, body.suggested_ip.strip()):
-            raise HTTPException(
-                status_code=409,
-                detail="This IP is already reserved in this network.",
-            )
+    if ip_taken:
+        raise HTTPException(
+            status_code=409,
+            detail="This IP is already reserved in this network.",
+        )
 
-    cert_manager = CertManager(session)
     duration = body.duration_days or settings.default_cert_expiry_days
     groups_list = [body.group] if (body.group and body.group.strip()) else []
     ip, cert_pem, private_key_pem, ca_pem, public_key_pem = await cert_manager.create_host_certificate(
         network=network,
-        name=body.name.strip(),
+        name=hostname,
         groups=groups_list,
-        suggested_ip=body.suggested_ip.strip() if body.suggested_ip else None,
+        suggested_ip=suggested_ip,
         duration_days=duration,
     )
 
     # Create new node (no duplicate; set lighthouse fields from request)
     node = Node(
         network_id=body.network_id,
-        hostname=body.name.strip(),
+        hostname=hostname,
         public_key=public_key_pem,
         ip_address=ip,
         status="active",
@@ -249,26 +263,27 @@ async def create_certificate(
         public_endpoint=body.public_endpoint.strip() if body.public_endpoint else None,
         lighthouse_options=body.lighthouse_options,
         punchy_options=body.punchy_options,
+        certificates=[Certificate(expires_at=utcnow() + timedelta(days=duration), cert_path=None)],
     )
+    # Node and certificate record are inserted by a single flush; the unique
+    # (network_id, hostname) constraint catches creates that race the check above
     session.add(node)
-    await session.flush()
-
-    expires_at = datetime.utcnow() + timedelta(days=duration)
-    cert_record = Certificate(
-        node_id=node.id,
-        expires_at=expires_at,
-        cert_path=None,
-    )
-    session.add(cert_record)
-    await session.flush()
-    user_result = await session.execute(select(User).where(User.oidc_sub == user.sub))
-    db_user = user_result.scalar_one_or_none()
+    try:
+        await session.flush()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(
+            status_code=409,
+            detail="A node with this name already exists in this network.",
+        )
+    user_result = await session.execute(select(User.id).where(User.oidc_sub == user.sub))
+    actor_user_id = user_result.scalar_one_or_none()
     await log_audit(
         session,
         "node_created",
         resource_type="node",
         resource_id=node.id,
-        actor_user_id=db_user.id if db_user else None,
+        actor_user_id=actor_user_id,
         actor_identifier=user.email or user.sub,
         client_ip=get_client_ip(request),
     )
@@ -291,7 +306,17 @@ async def list_certificates(
 ):
     """List issued certificates, optionally filtered by network."""
     stmt = (
-        select(Certificate, Node, Network)
+        select(
+            Certificate.id,
+            Node.id.label("node_id"),
+            Node.hostname.label("node_name"),
+            Network.id.label("network_id"),
+            Network.name.label("network_name"),
+            Node.ip_address,
+            Certificate.issued_at,
+            Certificate.expires_at,
+            Certificate.revoked_at,
+        )
         .join(Node, Certificate.node_id == Node.id)
         .join(Network, Node.network_id == Network.id)
     )
@@ -299,18 +324,5 @@ async def list_certificates(
         stmt = stmt.where(Network.id == network_id)
     stmt = stmt.order_by(Certificate.issued_at.desc())
     result = await session.execute(stmt)
-    rows = result.all()
-    return [
-        CertificateListItem(
-            id=c.id,
-            node_id=n.id,
-            node_name=n.hostname,
-            network_id=net.id,
-            network_name=net.name,
-            ip_address=n.ip_address,
-            issued_at=c.issued_at,
-            expires_at=c.expires_at,
-            revoked_at=c.revoked_at,
-        )
-        for c, n, net in rows
-    ]
+    # Columns are labelled to match CertificateListItem; validate the whole list in one pydantic-core call
+    return _certificate_list_adapter.validate_python(result.all(), from_attributes=True)
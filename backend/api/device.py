@@ -2,38 +2,58 @@
 Device API: enrollment codes (admin), enroll (public), config/certs (device token).
 dnclient-style: one-time code -> device token -> poll for config + certs.
 """
+import asyncio
 import hashlib
-import io
 import logging
 import secrets
-import zipfile
-from datetime import datetime, timedelta
+from datetime import timedelta
 from pathlib import Path
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.responses import PlainTextResponse, Response
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import Row, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..auth.oidc import require_user, require_device_token, UserInfo, create_device_token
-from ..config import settings
 from ..database import get_session
 from ..models import Network, NetworkDNSConfig, Node, EnrollmentCode, User
-from ..services.audit import get_client_ip, log_audit
+from ..services.audit import enqueue_audit, get_client_ip, log_audit
 from ..api.dns import get_dnsmasq_config_for_node
-from ..services.cert_store import read_cert_store_file
-from ..services.config_generator import generate_config_for_node
+from ..services.cert_store import (
+    build_certs_zip,
+    host_cert_paths,
+    read_cert_store_file,
+    read_cert_store_file_cached,
+)
+from ..services.config_cache import (
+    get_cached_config,
+    get_cached_config_etag,
+    network_config_generation,
+    set_cached_config,
+)
+from ..services.config_generator import (
+    HOST_KEY_PLACEHOLDER,
+    generate_config_for_node,
+    splice_host_key,
+)
+from ..services.encryption import enrollment_code_digest
+from ..utils.timeutils import utcnow
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/device", tags=["device"])
 
 
+# 32 unambiguous characters: 256 is a multiple of 32, so mapping random bytes onto this
+# alphabet by table lookup is uniform without rejection sampling
+_CODE_ALPHABET = b"ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
+_CODE_TRANSLATION = bytes(_CODE_ALPHABET[i % len(_CODE_ALPHABET)] for i in range(256))
+
+
 def _random_code(length: int = 16) -> str:
     """Alphanumeric code (easy to type)."""
-    alphabet = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"
-    return "".join(secrets.choice(alphabet) for _ in range(length))
+    return secrets.token_bytes(length).translate(_CODE_TRANSLATION).decode("ascii")
 
 
 # --- Admin: create enrollment code ---
@@ -57,8 +77,11 @@ async def create_enrollment_code(
     session: AsyncSession = Depends(get_session),
 ):
     """Create a one-time enrollment code for a node. Client uses this with POST /device/enroll."""
-    result = await session.execute(select(Node).where(Node.id == body.node_id))
-    node = result.scalar_one_or_none()
+    # Only id, hostname and ip_address are needed; skip ORM entity hydration
+    result = await session.execute(
+        select(Node.id, Node.hostname, Node.ip_address).where(Node.id == body.node_id)
+    )
+    node = result.first()
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     if not node.ip_address:
@@ -66,23 +89,23 @@ async def create_enrollment_code(
             status_code=400,
             detail="Node has no certificate yet. Create a certificate first.",
         )
-    user_result = await session.execute(select(User).where(User.oidc_sub == user.sub))
-    db_user = user_result.scalar_one_or_none()
-    code = _random_code().upper()
-    expires_at = datetime.utcnow() + timedelta(hours=body.expires_in_hours)
+    user_result = await session.execute(select(User.id).where(User.oidc_sub == user.sub))
+    actor_user_id = user_result.scalar_one_or_none()
+    code = _random_code()
+    expires_at = utcnow() + timedelta(hours=body.expires_in_hours)
     rec = EnrollmentCode(
         node_id=node.id,
-        code=code,
+        code_hash=enrollment_code_digest(code),
         expires_at=expires_at,
     )
+    # Nothing here needs rec.id; the code and its audit entry are inserted together on commit
     session.add(rec)
-    await session.flush()
     await log_audit(
         session,
         "enrollment_code_created",
         resource_type="node",
         resource_id=node.id,
-        actor_user_id=db_user.id if db_user else None,
+        actor_user_id=actor_user_id,
         actor_identifier=user.email or user.sub,
     )
     return CreateEnrollmentCodeResponse(
@@ -121,47 +144,38 @@ async def enroll(
     code = (body.code or "").strip().upper()
     if not code:
         raise HTTPException(status_code=400, detail="Code is required")
+    now = utcnow()
+    # Redeem atomically: only one concurrent request can flip used_at on a valid code
     result = await session.execute(
-        select(EnrollmentCode).where(EnrollmentCode.code == code)
+        update(EnrollmentCode)
+        .where(
+            EnrollmentCode.code_hash == enrollment_code_digest(code),
+            EnrollmentCode.used_at.is_(None),
+            EnrollmentCode.expires_at >= now,
+        )
+        .values(used_at=now)
+        .returning(EnrollmentCode.node_id)
     )
-    rec = result.scalar_one_or_none()
-    if not rec:
-        await log_audit(
-            session,
+    node_id = result.scalar_one_or_none()
+    if node_id is None:
+        # Unknown, used and expired codes are indistinguishable to the caller. Nothing was
+        # written, so the audit entry goes to the background writer instead of a commit here.
+        enqueue_audit(
             "device_enroll_failure",
             result="failure",
             actor_identifier="device",
             details={"reason": "invalid_or_expired_code"},
             client_ip=client_ip,
         )
-        await session.commit()
         raise HTTPException(status_code=404, detail="Invalid or expired code")
-    if rec.used_at:
-        await log_audit(
-            session,
-            "device_enroll_failure",
-            result="failure",
-            actor_identifier="device",
-            details={"reason": "code_already_used"},
-            client_ip=client_ip,
-        )
-        await session.commit()
-        raise HTTPException(status_code=400, detail="Code already used")
-    if datetime.utcnow() > rec.expires_at:
-        await log_audit(
-            session,
-            "device_enroll_failure",
-            result="failure",
-            actor_identifier="device",
-            details={"reason": "code_expired"},
-            client_ip=client_ip,
-        )
-        await session.commit()
-        raise HTTPException(status_code=400, detail="Code expired")
-    rec.used_at = datetime.utcnow()
-    await session.flush()
-    result = await session.execute(select(Node).where(Node.id == rec.node_id))
-    node = result.scalar_one_or_none()
+    # Bump the device token version so any previously issued tokens for this node are invalidated.
+    result = await session.execute(
+        update(Node)
+        .where(Node.id == node_id)
+        .values(device_token_version=func.coalesce(Node.device_token_version, 1) + 1)
+        .returning(Node.id, Node.hostname, Node.device_token_version)
+    )
+    node = result.first()
     if not node:
         raise HTTPException(status_code=404, detail="Node not found")
     await log_audit(
@@ -172,9 +186,6 @@ async def enroll(
         actor_identifier=node.hostname or "device",
         client_ip=client_ip,
     )
-    # Bump the device token version so any previously issued tokens for this node are invalidated.
-    node.device_token_version = (node.device_token_version or 1) + 1
-    await session.flush()
     device_token = create_device_token(node.id, node.device_token_version)
     return EnrollResponse(
         device_token=device_token,
@@ -202,11 +213,10 @@ async def device_dns_client_config(
     Return split-horizon DNS config for this device: domain and DNS server IPs (lighthouse Nebula IPs).
     Use Authorization: Bearer <device_token>. Returns 404 if DNS is not enabled for the network.
     """
-    result = await session.execute(select(Node).where(Node.id == node_id))
-    node = result.scalar_one_or_none()
-    if not node:
+    result = await session.execute(select(Node.network_id).where(Node.id == node_id))
+    network_id = result.scalar_one_or_none()
+    if network_id is None:
         raise HTTPException(status_code=404, detail="Node not found")
-    network_id = node.network_id
 
     cfg_result = await session.execute(
         select(NetworkDNSConfig).where(NetworkDNSConfig.network_id == network_id)
@@ -217,17 +227,13 @@ async def device_dns_client_config(
 
     # Lighthouses serve DNS (dnsmasq in ncclient container); collect their Nebula IPs.
     lighthouses_result = await session.execute(
-        select(Node).where(
+        select(Node.ip_address).where(
             Node.network_id == network_id,
             Node.is_lighthouse == True,
             Node.ip_address.isnot(None),
         )
     )
-    dns_servers = [
-        n.ip_address
-        for n in lighthouses_result.scalars().all()
-        if n.ip_address and n.ip_address.strip()
-    ]
+    dns_servers = [ip for ip in lighthouses_result.scalars().all() if ip.strip()]
 
     return DNSClientConfigResponse(
         domain=cfg.domain,
@@ -260,58 +266,130 @@ async def device_dnsmasq_config(
     return response
 
 
-@router.get("/config")
-async def device_config(
-    request: Request,
-    node_id: int = Depends(require_device_token),
-    session: AsyncSession = Depends(get_session),
-):
+async def _load_polling_node(session: AsyncSession, node_id: int) -> Row:
     """
-    Return Nebula YAML config for this device (inline PKI). Use Authorization: Bearer <device_token>.
-    Send If-None-Match: <etag> to get 304 when config unchanged.
+    Columns the device config/certs endpoints need, with the network's CA path, in one
+    joined SELECT of plain rows (no ORM instances). Raises 404 like the endpoints did.
+    Records the node's first poll.
     """
-    result = await session.execute(select(Node).where(Node.id == node_id))
-    node = result.scalar_one_or_none()
-    if not node:
+    result = await session.execute(
+        select(
+            Node.id,
+            Node.hostname,
+            Node.network_id,
+            Node.ip_address,
+            Node.first_polled_at,
+            Network.id.label("joined_network_id"),
+            Network.ca_cert_path,
+        )
+        .outerjoin(Network, Network.id == Node.network_id)
+        .where(Node.id == node_id)
+    )
+    node = result.first()
+    if node is None:
         raise HTTPException(status_code=404, detail="Node not found")
     if node.first_polled_at is None:
-        node.first_polled_at = datetime.utcnow()
-        await session.flush()
+        await _mark_first_polled(session, node.id)
     if not node.ip_address:
         raise HTTPException(
             status_code=404,
             detail="Node has no certificate. Create a certificate in the UI first.",
         )
-    result = await session.execute(select(Network).where(Network.id == node.network_id))
-    network = result.scalar_one_or_none()
-    if not network or not network.ca_cert_path:
+    if node.joined_network_id is None or not node.ca_cert_path:
         raise HTTPException(status_code=404, detail="Network or CA not found")
-    host_cert_path = Path(settings.cert_store_path) / str(node.network_id) / "hosts" / f"{node.hostname}.crt"
-    if not host_cert_path.exists():
+    return node
+
+
+async def _mark_first_polled(session: AsyncSession, node_id: int) -> None:
+    """Record the first device poll in one conditional UPDATE (a racing poll matches no row)."""
+    await session.execute(
+        update(Node)
+        .where(Node.id == node_id, Node.first_polled_at.is_(None))
+        .values(first_polled_at=utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Cert store file access for the device endpoints. These run via asyncio.to_thread so
+# stat/read/decrypt calls do not block the event loop.
+
+
+def _inline_pki_paths(node: Row) -> tuple[Path, Path, Path]:
+    """(ca.crt, host .crt, host .key) paths in the cert store for a _load_polling_node row."""
+    return (Path(node.ca_cert_path), *host_cert_paths(node.network_id, node.hostname))
+
+
+def _stat_inline_pki(ca_path: Path, host_cert_path: Path, host_key_path: Path) -> tuple[int, int, int]:
+    """Return mtime_ns of (ca, host cert, host key); 404 if any file is missing."""
+    try:
+        host_cert_mtime = host_cert_path.stat().st_mtime_ns
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Host certificate not found")
-    host_key_path = Path(settings.cert_store_path) / str(node.network_id) / "hosts" / f"{node.hostname}.key"
-    if not host_key_path.exists():
+    try:
+        host_key_mtime = host_key_path.stat().st_mtime_ns
+    except FileNotFoundError:
         raise HTTPException(
             status_code=404,
             detail="Host key not stored. Create the certificate in the UI so the key is stored for inline config.",
         )
-    ca_path = Path(network.ca_cert_path)
-    if not ca_path.exists():
+    try:
+        ca_mtime = ca_path.stat().st_mtime_ns
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="CA certificate not found")
-    ca_content = read_cert_store_file(ca_path)
-    host_cert_content = read_cert_store_file(host_cert_path)
-    host_key_content = read_cert_store_file(host_key_path)
-    inline_pki = (ca_content, host_cert_content, host_key_content)
-    yaml_config = await generate_config_for_node(session, node_id, inline_pki=inline_pki)
-    if yaml_config is None:
-        raise HTTPException(status_code=404, detail="Node not found")
-    etag = hashlib.sha256(yaml_config.encode("utf-8")).hexdigest()
+    return ca_mtime, host_cert_mtime, host_key_mtime
+
+
+def _read_inline_pki(ca_path: Path, host_cert_path: Path, host_key_path: Path) -> tuple[str, str, str]:
+    return (
+        read_cert_store_file_cached(ca_path),
+        read_cert_store_file_cached(host_cert_path),
+        read_cert_store_file(host_key_path),
+    )
+
+
+@router.get("/config")
+async def device_config(
+    request: Request,
+    node_id: int = Depends(require_device_token),
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Return Nebula YAML config for this device (inline PKI). Use Authorization: Bearer <device_token>.
+    Send If-None-Match: <etag> to get 304 when config unchanged.
+    """
+    node = await _load_polling_node(session, node_id)
+    ca_path, host_cert_path, host_key_path = _inline_pki_paths(node)
+    pki_mtimes = await asyncio.to_thread(_stat_inline_pki, ca_path, host_cert_path, host_key_path)
+    # Rendered config is reused until the network's config generation or a PKI file changes
+    version = (network_config_generation(node.network_id), *pki_mtimes)
     if_none_match = (request.headers.get("If-None-Match") or "").strip().strip('"')
+    # Client already has the config for this version: answer before reading or rendering
+    if if_none_match and if_none_match == get_cached_config_etag(node.id, version):
+        return Response(status_code=304)
+    # The cached YAML holds a placeholder for the host key; the key is read per response
+    cached = get_cached_config(node.id, version)
+    if cached is not None:
+        etag, template = cached
+        host_key = await asyncio.to_thread(read_cert_store_file, host_key_path)
+        yaml_bytes = splice_host_key(template, host_key)
+    else:
+        ca_pem, cert_pem, host_key = await asyncio.to_thread(
+            _read_inline_pki, ca_path, host_cert_path, host_key_path
+        )
+        yaml_config = await generate_config_for_node(
+            session, node_id, inline_pki=(ca_pem, cert_pem, HOST_KEY_PLACEHOLDER)
+        )
+        if yaml_config is None:
+            raise HTTPException(status_code=404, detail="Node not found")
+        template = yaml_config.encode("utf-8")
+        yaml_bytes = splice_host_key(template, host_key)
+        etag = hashlib.sha256(yaml_bytes).hexdigest()
+        set_cached_config(node.id, version, etag, template)
     if if_none_match and if_none_match == etag:
         return Response(status_code=304)
     filename = f"{node.hostname}.yaml" if node else "config.yaml"
     return Response(
-        content=yaml_config,
+        content=yaml_bytes,
         media_type="application/yaml",
         headers={
             "Content-Disposition": f'attachment; filename="{filename}"',
@@ -326,48 +404,16 @@ async def device_certs(
     session: AsyncSession = Depends(get_session),
 ):
     """Return ZIP with ca.crt, host.crt, README for this device."""
-    result = await session.execute(select(Node).where(Node.id == node_id))
-    node = result.scalar_one_or_none()
-    if not node:
-        raise HTTPException(status_code=404, detail="Node not found")
-    if node.first_polled_at is None:
-        node.first_polled_at = datetime.utcnow()
-        await session.flush()
-    if not node.ip_address:
-        raise HTTPException(
-            status_code=404,
-            detail="Node has no certificate. Create a certificate in the UI first.",
-        )
-    result = await session.execute(select(Network).where(Network.id == node.network_id))
-    network = result.scalar_one_or_none()
-    if not network or not network.ca_cert_path:
-        raise HTTPException(status_code=404, detail="Network or CA not found")
-    host_cert_path = Path(settings.cert_store_path) / str(node.network_id) / "hosts" / f"{node.hostname}.crt"
-    if not host_cert_path.exists():
-        raise HTTPException(status_code=404, detail="Host certificate file not found")
-    host_key_path = Path(settings.cert_store_path) / str(node.network_id) / "hosts" / f"{node.hostname}.key"
-    ca_path = Path(network.ca_cert_path)
-    if not ca_path.exists():
-        raise HTTPException(status_code=404, detail="CA certificate file not found")
-    ca_content = read_cert_store_file(ca_path)
-    host_cert_content = read_cert_store_file(host_cert_path)
-    if host_key_path.exists():
-        host_key_content = read_cert_store_file(host_key_path)
-        readme = "host.key is included in this zip.\n"
-    else:
-        host_key_content = None
-        readme = "Use the host.key you saved when creating this certificate.\n"
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr("ca.crt", ca_content)
-        zf.writestr("host.crt", host_cert_content)
-        if host_key_content is not None:
-            zf.writestr("host.key", host_key_content)
-        zf.writestr("README.txt", readme)
-    buf.seek(0)
+    node = await _load_polling_node(session, node_id)
+    # Not cached as a whole: the bundle holds the decrypted host.key, which is read per
+    # request; the CA and host cert come from the cert store's decrypted-cert cache
+    try:
+        zip_bytes = await asyncio.to_thread(build_certs_zip, *_inline_pki_paths(node))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     filename = f"node-{node.hostname}-certs.zip"
     return Response(
-        content=buf.getvalue(),
+        content=zip_bytes,
         media_type="application/zip",
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
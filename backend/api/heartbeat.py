@@ -1,6 +1,4 @@
 """Heartbeat API: nodes report status to update last_seen and status."""
-from datetime import datetime
-
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -8,6 +6,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ..auth.oidc import require_user, UserInfo
 from ..database import get_session
 from ..models import Node
+from ..services.heartbeats import record_heartbeat
+from ..utils.timeutils import utcnow
 
 router = APIRouter(prefix="/api/nodes", tags=["heartbeat"])
 
@@ -19,11 +19,10 @@ async def node_heartbeat(
     session: AsyncSession = Depends(get_session),
 ):
     """Update node last_seen and set status to active. Call periodically from Nebula nodes."""
-    result = await session.execute(select(Node).where(Node.id == node_id))
-    node = result.scalar_one_or_none()
-    if not node:
+    result = await session.execute(select(Node.id).where(Node.id == node_id))
+    if result.scalar_one_or_none() is None:
         raise HTTPException(status_code=404, detail="Node not found")
-    node.last_seen = datetime.utcnow()
-    node.status = "active"
-    await session.flush()
-    return {"ok": True, "last_seen": node.last_seen.isoformat()}
+    # Written in a batch by the heartbeat writer (services/heartbeats.py)
+    last_seen = utcnow()
+    record_heartbeat(node_id, last_seen)
+    return {"ok": True, "last_seen": last_seen.isoformat()}
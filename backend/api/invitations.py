@@ -5,19 +5,31 @@ from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status, BackgroundTasks
 from pydantic import BaseModel, EmailStr
-from sqlalchemy import select, or_
+from sqlalchemy import exists, select, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..auth.oidc import require_user, UserInfo, get_current_user_optional
-from ..auth.permissions import check_network_permission
+from ..auth.permissions import check_network_permission, get_db_user
 from ..database import get_session
 from ..models import Invitation, User, Network, NetworkPermission
 from ..services.audit import get_client_ip, log_audit
 from ..services.email import send_invitation_email
 from ..config import settings
+from ..utils.timeutils import request_now, utcnow
 
 router = APIRouter(prefix="/api/invitations", tags=["invitations"])
 
+_MONTH_NAMES = (
+    "January", "February", "March", "April", "May", "June",
+    "July", "August", "September", "October", "November", "December",
+)
+
+
+def _email_date(dt: datetime) -> str:
+    """Date for invitation emails, e.g. "March 05, 2026" (same as %B %d, %Y without the locale)."""
+    return f"{_MONTH_NAMES[dt.month - 1]} {dt.day:02d}, {dt.year}"
+
 
 class InvitationCreate(BaseModel):
     email: EmailStr
@@ -42,11 +54,11 @@ class InvitationResponse(BaseModel):
     can_invite_users: bool
     can_manage_firewall: bool
     status: str
-    expires_at: str
-    accepted_at: Optional[str] = None
-    created_at: str
+    expires_at: datetime
+    accepted_at: Optional[datetime] = None
+    created_at: datetime
     email_status: str
-    email_sent_at: Optional[str] = None
+    email_sent_at: Optional[datetime] = None
     email_error: Optional[str] = None
 
     class Config:
@@ -63,7 +75,7 @@ class InvitationPublicResponse(BaseModel):
     can_invite_users: bool
     can_manage_firewall: bool
     status: str
-    expires_at: str
+    expires_at: datetime
 
 
 @router.post("", response_model=InvitationResponse)
@@ -79,8 +91,7 @@ async def create_invitation(
     Requires network owner with can_invite_users permission.
     """
     # Get user's database record
-    user_result = await session.execute(select(User).where(User.oidc_sub == user.sub))
-    db_user = user_result.scalar_one_or_none()
+    db_user = await get_db_user(request, session, user)
     
     if not db_user:
         raise HTTPException(status_code=403, detail="User not found")
@@ -100,45 +111,36 @@ async def create_invitation(
                 detail="You don't have permission to invite users to this network"
             )
     
-    # Get network
-    network_result = await session.execute(select(Network).where(Network.id == body.network_id))
-    network = network_result.scalar_one_or_none()
+    # Network name and existing membership in one round trip
+    is_member = exists().where(
+        NetworkPermission.user_id == User.id,
+        User.email == body.email,
+        NetworkPermission.network_id == Network.id,
+    )
+    checks = (
+        await session.execute(
+            select(
+                Network.name,
+                is_member.label("is_member"),
+            ).where(Network.id == body.network_id)
+        )
+    ).first()
     
-    if not network:
+    if checks is None:
         raise HTTPException(status_code=404, detail="Network not found")
     
     # Check if user is already a member of this network
-    existing_perm = await session.execute(
-        select(NetworkPermission).join(
-            User, NetworkPermission.user_id == User.id
-        ).where(
-            User.email == body.email,
-            NetworkPermission.network_id == body.network_id
-        )
-    )
-    if existing_perm.scalar_one_or_none():
+    if checks.is_member:
         raise HTTPException(
             status_code=400,
             detail="User is already a member of this network"
         )
-    
-    # Check if there's already a pending invitation
-    existing_invitation = await session.execute(
-        select(Invitation).where(
-            Invitation.email == body.email,
-            Invitation.network_id == body.network_id,
-            Invitation.status == "pending"
-        )
-    )
-    if existing_invitation.scalar_one_or_none():
-        raise HTTPException(
-            status_code=400,
-            detail="There is already a pending invitation for this user to this network"
-        )
+    network_name = checks.name
     
     # Generate unique token
     token = secrets.token_urlsafe(32)
-    expires_at = datetime.utcnow() + timedelta(days=body.expires_in_days)
+    now = request_now(request)
+    expires_at = now + timedelta(days=body.expires_in_days)
     
     # Create invitation
     invitation = Invitation(
@@ -152,10 +154,19 @@ async def create_invitation(
         can_manage_firewall=body.can_manage_firewall,
         status="pending",
         expires_at=expires_at,
+        created_at=now,
         email_status="sending" if settings.smtp_enabled else "not_sent",
     )
     session.add(invitation)
-    await session.flush()
+    try:
+        await session.flush()
+    except IntegrityError:
+        # uq_invitation_pending_email_network: a pending invitation already exists
+        await session.rollback()
+        raise HTTPException(
+            status_code=400,
+            detail="There is already a pending invitation for this user to this network"
+        )
     await session.refresh(invitation)
     await log_audit(
         session,
@@ -182,7 +193,7 @@ async def create_invitation(
             send_invitation_email,
             invitation_id=invitation.id,
             to_email=invitation.email,
-            network_name=network.name,
+            network_name=network_name,
             invited_by_email=db_user.email or "Unknown",
             invitation_token=invitation.token,
             role=invitation.role,
@@ -191,7 +202,7 @@ async def create_invitation(
                 "can_invite_users": invitation.can_invite_users,
                 "can_manage_firewall": invitation.can_manage_firewall,
             },
-            expires_at=invitation.expires_at.strftime("%B %d, %Y"),
+            expires_at=_email_date(invitation.expires_at),
             base_url=base_url,
         )
     
@@ -199,7 +210,7 @@ async def create_invitation(
         id=invitation.id,
         email=invitation.email,
         network_id=invitation.network_id,
-        network_name=network.name,
+        network_name=network_name,
         invited_by_user_id=invitation.invited_by_user_id,
         invited_by_email=db_user.email,
         token=invitation.token,
@@ -208,17 +219,18 @@ async def create_invitation(
         can_invite_users=invitation.can_invite_users,
         can_manage_firewall=invitation.can_manage_firewall,
         status=invitation.status,
-        expires_at=invitation.expires_at.isoformat() if invitation.expires_at else "",
-        accepted_at=invitation.accepted_at.isoformat() if invitation.accepted_at else None,
-        created_at=invitation.created_at.isoformat() if invitation.created_at else "",
+        expires_at=invitation.expires_at,
+        accepted_at=invitation.accepted_at,
+        created_at=invitation.created_at,
         email_status=invitation.email_status,
-        email_sent_at=invitation.email_sent_at.isoformat() if invitation.email_sent_at else None,
+        email_sent_at=invitation.email_sent_at,
         email_error=invitation.email_error,
     )
 
 
 @router.get("", response_model=list[InvitationResponse])
 async def list_invitations(
+    request: Request,
     network_id: Optional[int] = None,
     status_filter: Optional[str] = None,
     user: UserInfo = Depends(require_user),
@@ -230,14 +242,17 @@ async def list_invitations(
     System admins see all invitations.
     """
     # Get user's database record
-    user_result = await session.execute(select(User).where(User.oidc_sub == user.sub))
-    db_user = user_result.scalar_one_or_none()
+    db_user = await get_db_user(request, session, user)
     
     if not db_user:
         return []
     
-    # Build query
-    stmt = select(Invitation)
+    # Build query: network name and inviter email joined in, not fetched per row
+    stmt = (
+        select(Invitation, Network.name, User.email)
+        .outerjoin(Network, Network.id == Invitation.network_id)
+        .outerjoin(User, User.id == Invitation.invited_by_user_id)
+    )
     
     # Filter by network ownership (unless system admin)
     if user.system_role != "system-admin":
@@ -269,25 +284,16 @@ async def list_invitations(
     stmt = stmt.order_by(Invitation.created_at.desc())
     
     result = await session.execute(stmt)
-    invitations = result.scalars().all()
     
     responses = []
-    for invitation in invitations:
-        # Get network
-        network_result = await session.execute(select(Network).where(Network.id == invitation.network_id))
-        network = network_result.scalar_one_or_none()
-        
-        # Get inviter
-        inviter_result = await session.execute(select(User).where(User.id == invitation.invited_by_user_id))
-        inviter = inviter_result.scalar_one_or_none()
-        
+    for invitation, network_name, inviter_email in result.all():
         responses.append(InvitationResponse(
             id=invitation.id,
             email=invitation.email,
             network_id=invitation.network_id,
-            network_name=network.name if network else "Unknown",
+            network_name=network_name if network_name is not None else "Unknown",
             invited_by_user_id=invitation.invited_by_user_id,
-            invited_by_email=inviter.email if inviter else None,
+            invited_by_email=inviter_email,
             token=invitation.token,
             role=invitation.role,
             can_manage_nodes=invitation.can_manage_nodes,
@@ -295,11 +301,11 @@ async def list_invitations(
             can_manage_firewall=invitation.can_manage_firewall,
             status=invitation.status,
             email_status=invitation.email_status,
-            email_sent_at=invitation.email_sent_at.isoformat() if invitation.email_sent_at else None,
+            email_sent_at=invitation.email_sent_at,
             email_error=invitation.email_error,
-            expires_at=invitation.expires_at.isoformat() if invitation.expires_at else "",
-            accepted_at=invitation.accepted_at.isoformat() if invitation.accepted_at else None,
-            created_at=invitation.created_at.isoformat() if invitation.created_at else "",
+            expires_at=invitation.expires_at,
+            accepted_at=invitation.accepted_at,
+            created_at=invitation.created_at,
         ))
     
     return responses
@@ -314,15 +320,21 @@ async def get_invitation_public(
     Get invitation details by token (public endpoint, no auth required).
     Used to display invitation details before accepting.
     """
-    # Get invitation
-    result = await session.execute(select(Invitation).where(Invitation.token == token))
-    invitation = result.scalar_one_or_none()
+    # Invitation with its network name and inviter email in one query
+    result = await session.execute(
+        select(Invitation, Network.name, User.email)
+        .outerjoin(Network, Network.id == Invitation.network_id)
+        .outerjoin(User, User.id == Invitation.invited_by_user_id)
+        .where(Invitation.token == token)
+    )
+    row = result.first()
     
-    if not invitation:
+    if row is None:
         raise HTTPException(status_code=404, detail="Invitation not found")
+    invitation, network_name, inviter_email = row
     
     # Check if expired
-    if invitation.expires_at < datetime.utcnow():
+    if invitation.expires_at < utcnow():
         if invitation.status == "pending":
             invitation.status = "expired"
             await session.flush()
@@ -335,24 +347,16 @@ async def get_invitation_public(
             detail=f"Invitation is {invitation.status}"
         )
     
-    # Get network
-    network_result = await session.execute(select(Network).where(Network.id == invitation.network_id))
-    network = network_result.scalar_one_or_none()
-    
-    # Get inviter
-    inviter_result = await session.execute(select(User).where(User.id == invitation.invited_by_user_id))
-    inviter = inviter_result.scalar_one_or_none()
-    
     return InvitationPublicResponse(
         email=invitation.email,
-        network_name=network.name if network else "Unknown",
-        invited_by_email=inviter.email if inviter else None,
+        network_name=network_name if network_name is not None else "Unknown",
+        invited_by_email=inviter_email,
         role=invitation.role,
         can_manage_nodes=invitation.can_manage_nodes,
         can_invite_users=invitation.can_invite_users,
         can_manage_firewall=invitation.can_manage_firewall,
         status=invitation.status,
-        expires_at=invitation.expires_at.isoformat() if invitation.expires_at else "",
+        expires_at=invitation.expires_at,
     )
 
 
@@ -374,6 +378,8 @@ async def accept_invitation(
             detail="You must be logged in to accept an invitation"
         )
     
+    now = request_now(request)
+    
     # Get invitation
     result = await session.execute(select(Invitation).where(Invitation.token == token))
     invitation = result.scalar_one_or_none()
@@ -382,7 +388,7 @@ async def accept_invitation(
         raise HTTPException(status_code=404, detail="Invitation not found")
     
     # Check if expired
-    if invitation.expires_at < datetime.utcnow():
+    if invitation.expires_at < now:
         if invitation.status == "pending":
             invitation.status = "expired"
             await session.flush()
@@ -396,8 +402,7 @@ async def accept_invitation(
         )
     
     # Get or create user
-    user_result = await session.execute(select(User).where(User.oidc_sub == user_info.sub))
-    db_user = user_result.scalar_one_or_none()
+    db_user = await get_db_user(request, session, user_info)
     
     if not db_user:
         # Create user if doesn't exist
@@ -427,7 +432,7 @@ async def accept_invitation(
     if existing_perm.scalar_one_or_none():
         # Mark as accepted anyway
         invitation.status = "accepted"
-        invitation.accepted_at = datetime.utcnow()
+        invitation.accepted_at = now
         await session.flush()
         return {"message": "You are already a member of this network"}
     
@@ -445,7 +450,7 @@ async def accept_invitation(
     
     # Mark invitation as accepted
     invitation.status = "accepted"
-    invitation.accepted_at = datetime.utcnow()
+    invitation.accepted_at = now
     
     await session.flush()
     await log_audit(
@@ -470,18 +475,23 @@ async def resend_invitation_email(
     session: AsyncSession = Depends(get_session),
 ):
     """Resend invitation email."""
-    # Get invitation
-    invitation = await session.get(Invitation, invitation_id)
-    if not invitation:
+    # Get invitation and its network in one query
+    result = await session.execute(
+        select(Invitation, Network)
+        .outerjoin(Network, Network.id == Invitation.network_id)
+        .where(Invitation.id == invitation_id)
+    )
+    row = result.first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Invitation not found")
+    invitation, network = row
     
     # Check permissions (must be network owner or system admin)
-    network = await session.get(Network, invitation.network_id)
     if not network:
         raise HTTPException(status_code=404, detail="Network not found")
     
     # Get user details
-    db_user = await session.scalar(select(User).where(User.oidc_sub == user.sub))
+    db_user = await get_db_user(request, session, user)
     if not db_user:
         raise HTTPException(status_code=403, detail="User not found")
     
@@ -528,7 +538,7 @@ async def resend_invitation_email(
                 "can_invite_users": invitation.can_invite_users,
                 "can_manage_firewall": invitation.can_manage_firewall,
             },
-            expires_at=invitation.expires_at.strftime("%B %d, %Y"),
+            expires_at=_email_date(invitation.expires_at),
             base_url=base_url,
         )
     
@@ -556,11 +566,11 @@ async def resend_invitation_email(
         can_manage_firewall=invitation.can_manage_firewall,
         status=invitation.status,
         email_status=invitation.email_status,
-        email_sent_at=invitation.email_sent_at.isoformat() if invitation.email_sent_at else None,
+        email_sent_at=invitation.email_sent_at,
         email_error=invitation.email_error,
-        expires_at=invitation.expires_at.isoformat(),
-        accepted_at=invitation.accepted_at.isoformat() if invitation.accepted_at else None,
-        created_at=invitation.created_at.isoformat(),
+        expires_at=invitation.expires_at,
+        accepted_at=invitation.accepted_at,
+        created_at=invitation.created_at,
     )
 
 
@@ -576,8 +586,7 @@ async def revoke_invitation(
     Only the inviter or network owners can revoke.
     """
     # Get user's database record
-    user_result = await session.execute(select(User).where(User.oidc_sub == user.sub))
-    db_user = user_result.scalar_one_or_none()
+    db_user = await get_db_user(request, session, user)
     
     if not db_user:
         raise HTTPException(status_code=403, detail="User not found")
@@ -11,6 +11,7 @@ from ..auth.permissions import check_network_permission
 from ..database import get_session
 from ..models import NetworkPermission, User, Network
 from ..services.audit import get_client_ip, log_audit
+from ..services.batch import batch_fetch_users
 
 router = APIRouter(prefix="/api/networks", tags=["network-permissions"])
 
@@ -85,18 +86,15 @@ async def list_network_users(
         select(NetworkPermission).where(NetworkPermission.network_id == network_id)
     )
     permissions = result.scalars().all()
+    # Members and inviters in one query
+    users_by_id = await batch_fetch_users(
+        session, [p.user_id for p in permissions] + [p.invited_by_user_id for p in permissions]
+    )
     
     responses = []
     for perm in permissions:
-        # Get user
-        perm_user_result = await session.execute(select(User).where(User.id == perm.user_id))
-        perm_user = perm_user_result.scalar_one_or_none()
-        
-        # Get inviter if exists
-        inviter = None
-        if perm.invited_by_user_id:
-            inviter_result = await session.execute(select(User).where(User.id == perm.invited_by_user_id))
-            inviter = inviter_result.scalar_one_or_none()
+        perm_user = users_by_id.get(perm.user_id)
+        inviter = users_by_id.get(perm.invited_by_user_id)
         
         responses.append(NetworkUserResponse(
             user_id=perm.user_id,
@@ -5,6 +5,7 @@ from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Request, status
 from pydantic import BaseModel
 from sqlalchemy import select, or_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..auth.oidc import require_user, UserInfo
@@ -12,6 +13,7 @@ from ..auth.permissions import check_network_permission
 from ..database import get_session
 from ..models import NodeRequest, Network, User, NetworkPermission, NetworkSettings, Node
 from ..services.audit import get_client_ip, log_audit
+from ..services.batch import batch_fetch_networks, batch_fetch_users
 
 router = APIRouter(prefix="/api/node-requests", tags=["node-requests"])
 
@@ -124,7 +126,14 @@ async def create_node_request(
             status="pending",
         )
         session.add(node)
-        await session.flush()
+        try:
+            await session.flush()
+        except IntegrityError:
+            await session.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A node with this name already exists in this network."
+            )
         await session.refresh(node)
         
         node_request.created_node_id = node.id
@@ -225,16 +234,13 @@ async def list_node_requests(
     
     result = await session.execute(stmt)
     requests = result.scalars().all()
+    networks_by_id = await batch_fetch_networks(session, [r.network_id for r in requests])
+    requesters_by_id = await batch_fetch_users(session, [r.requested_by_user_id for r in requests])
     
     responses = []
     for req in requests:
-        # Get network name
-        network_result = await session.execute(select(Network).where(Network.id == req.network_id))
-        network = network_result.scalar_one_or_none()
-        
-        # Get requester email
-        requester_result = await session.execute(select(User).where(User.id == req.requested_by_user_id))
-        requester = requester_result.scalar_one_or_none()
+        network = networks_by_id.get(req.network_id)
+        requester = requesters_by_id.get(req.requested_by_user_id)
         
         responses.append(NodeRequestResponse(
             id=req.id,
@@ -313,7 +319,14 @@ async def approve_node_request(
         status="pending",
     )
     session.add(node)
-    await session.flush()
+    try:
+        await session.flush()
+    except IntegrityError:
+        await session.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A node with this name already exists in this network."
+        )
     await session.refresh(node)
     
     # Update request
@@ -1,7 +1,6 @@
 """Nodes API: list and manage Nebula nodes."""
-import io
+import asyncio
 import logging
-import zipfile
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Optional
@@ -14,14 +13,18 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..auth.oidc import require_user, UserInfo
 from ..auth.permissions import get_user_nodes
-from ..config import settings
 from ..database import get_session
 from ..models import Certificate, EnrollmentCode, Network, NetworkConfig, Node, User
 from ..services.audit import get_client_ip, log_audit
-from ..services.cert_store import read_cert_store_file
+from ..services.cert_store import (
+    build_certs_zip,
+    host_cert_paths,
+    read_cert_store_file,
+    read_cert_store_file_cached,
+)
 from ..services.config_generator import generate_config_for_node
 from ..services.ip_allocator import IPAllocator
-from ..services.cert_manager import CertManager
+from ..services.cert_manager import CertManager, get_cert_manager
 
 logger = logging.getLogger(__name__)
 
@@ -136,15 +139,14 @@ async def get_node_config(
     network = result.scalar_one_or_none()
     if not network or not network.ca_cert_path:
         raise HTTPException(status_code=404, detail="Network or CA not found")
-    host_cert_path = Path(settings.cert_store_path) / str(node.network_id) / "hosts" / f"{node.hostname}.crt"
+    host_cert_path, host_key_path = host_cert_paths(node.network_id, node.hostname)
     if not host_cert_path.exists():
         raise HTTPException(status_code=404, detail="Host certificate not found")
-    host_key_path = Path(settings.cert_store_path) / str(node.network_id) / "hosts" / f"{node.hostname}.key"
     ca_path = Path(network.ca_cert_path)
     if not ca_path.exists():
         raise HTTPException(status_code=404, detail="CA certificate not found")
-    ca_content = read_cert_store_file(ca_path)
-    host_cert_content = read_cert_store_file(host_cert_path)
+    ca_content = read_cert_store_file_cached(ca_path)
+    host_cert_content = read_cert_store_file_cached(host_cert_path)
     if host_key_path.exists():
         host_key_content = read_cert_store_file(host_key_path)
         inline_pki = (ca_content, host_cert_content, host_key_content)
@@ -194,28 +196,13 @@ async def get_node_certs(
     network = result.scalar_one_or_none()
     if not network or not network.ca_cert_path:
         raise HTTPException(status_code=404, detail="Network or CA not found")
-    host_cert_path = Path(settings.cert_store_path) / str(node.network_id) / "hosts" / f"{node.hostname}.crt"
-    if not host_cert_path.exists():
-        raise HTTPException(status_code=404, detail="Host certificate file not found")
-    host_key_path = Path(settings.cert_store_path) / str(node.network_id) / "hosts" / f"{node.hostname}.key"
-    ca_path = Path(network.ca_cert_path)
-    if not ca_path.exists():
-        raise HTTPException(status_code=404, detail="CA certificate file not found")
-    ca_content = read_cert_store_file(ca_path)
-    host_cert_content = read_cert_store_file(host_cert_path)
-    if host_key_path.exists():
-        host_key_content = read_cert_store_file(host_key_path)
-        readme = "host.key is included in this zip.\n"
-    else:
-        host_key_content = None
-        readme = "Use the host.key you saved when creating this certificate.\n"
-    buf = io.BytesIO()
-    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr("ca.crt", ca_content)
-        zf.writestr("host.crt", host_cert_content)
-        if host_key_content is not None:
-            zf.writestr("host.key", host_key_content)
-        zf.writestr("README.txt", readme)
+    host_cert_path, host_key_path = host_cert_paths(node.network_id, node.hostname)
+    try:
+        zip_bytes = await asyncio.to_thread(
+            build_certs_zip, Path(network.ca_cert_path), host_cert_path, host_key_path
+        )
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     user_result = await session.execute(select(User).where(User.oidc_sub == user.sub))
     db_user = user_result.scalar_one_or_none()
     await log_audit(
@@ -227,10 +214,9 @@ async def get_node_certs(
         actor_identifier=user.email or user.sub,
         client_ip=get_client_ip(request),
     )
-    buf.seek(0)
     filename = f"node-{node.hostname}-certs.zip"
     return Response(
-        content=buf.getvalue(),
+        content=zip_bytes,
         media_type="application/zip",
         headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
@@ -423,9 +409,7 @@ async def delete_node(
         await ip_allocator.release(node.network_id, node.ip_address)
 
     # 2. Remove host cert/key files from disk
-    hosts_dir = Path(settings.cert_store_path) / str(node.network_id) / "hosts"
-    for ext in (".crt", ".key"):
-        p = hosts_dir / f"{node.hostname}{ext}"
+    for p in host_cert_paths(node.network_id, node.hostname):
         try:
             p.unlink(missing_ok=True)
         except OSError:
@@ -477,9 +461,7 @@ async def revoke_node_certificate(
     if node.ip_address:
         ip_allocator = IPAllocator(session)
         await ip_allocator.release(node.network_id, node.ip_address)
-        hosts_dir = Path(settings.cert_store_path) / str(node.network_id) / "hosts"
-        for ext in (".crt", ".key"):
-            p = hosts_dir / f"{node.hostname}{ext}"
+        for p in host_cert_paths(node.network_id, node.hostname):
             try:
                 p.unlink(missing_ok=True)
             except OSError:
@@ -510,6 +492,7 @@ async def reenroll_node(
     request: Request,
     user: UserInfo = Depends(require_user),
     session: AsyncSession = Depends(get_session),
+    cert_manager: CertManager = Depends(get_cert_manager),
 ):
     """Revoke existing certificate (if any) and issue a new one for this node. Returns success; frontend creates enrollment code."""
     result = await session.execute(select(Node).where(Node.id == node_id))
@@ -526,9 +509,7 @@ async def reenroll_node(
         await session.flush()
         ip_allocator = IPAllocator(session)
         await ip_allocator.release(node.network_id, node.ip_address)
-        hosts_dir = Path(settings.cert_store_path) / str(node.network_id) / "hosts"
-        for ext in (".crt", ".key"):
-            p = hosts_dir / f"{node.hostname}{ext}"
+        for p in host_cert_paths(node.network_id, node.hostname):
             try:
                 p.unlink(missing_ok=True)
             except OSError:
@@ -549,7 +530,6 @@ async def reenroll_node(
     if not network:
         raise HTTPException(status_code=404, detail="Network not found")
 
-    cert_manager = CertManager(session)
     await cert_manager.create_host_certificate_for_existing_node(node, network)
     await session.flush()
     user_result = await session.execute(select(User).where(User.oidc_sub == user.sub))
@@ -11,6 +11,7 @@ from ..auth.permissions import require_system_admin
 from ..database import get_session
 from ..models import User, NetworkPermission
 from ..services.audit import get_client_ip, log_audit
+from ..services.batch import batch_fetch_networks
 
 router = APIRouter(prefix="/api/users", tags=["users"])
 
@@ -79,12 +80,11 @@ async def get_user(
         select(NetworkPermission).where(NetworkPermission.user_id == user_id)
     )
     permissions = network_result.scalars().all()
+    networks_by_id = await batch_fetch_networks(session, [p.network_id for p in permissions])
     
     networks = []
     for perm in permissions:
-        from ..models import Network
-        net_result = await session.execute(select(Network).where(Network.id == perm.network_id))
-        network = net_result.scalar_one_or_none()
+        network = networks_by_id.get(perm.network_id)
         if network:
             networks.append({
                 "id": network.id,
@@ -4,14 +4,16 @@ or from our own JWT secret. When oidc_issuer_url is set, JWTs are validated usin
 provider's JWKS; otherwise the configured JWT secret is used.
 Also: device tokens (JWT with sub=device, node_id, ver) for dnclient-style enrollment.
 """
+import hashlib
 import logging
-from datetime import datetime, timedelta
+import time
 from typing import Annotated, Optional
 
 import httpx
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from jose import JWTError, jwk, jwt
+import jwt
+from jwt import PyJWK, PyJWTError
 from pydantic import BaseModel
 
 from sqlalchemy import select
@@ -20,6 +22,8 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from ..config import settings
 from ..database import get_session
 from ..models.db import Node
+from ..utils.ttl_cache import TTLCache
+from .tokens import encode_token
 
 logger = logging.getLogger(__name__)
 
@@ -64,14 +68,46 @@ def _get_signing_key_from_jwks(token: str, issuer_url: str) -> Optional[dict]:
         return None
 
 
+# Recently validated bearer tokens (sha256 prefix -> payload); short TTL, never past exp
+_DECODED_TOKEN_TTL_SECONDS = 30
+_decoded_token_cache = TTLCache(maxsize=10000, ttl=_DECODED_TOKEN_TTL_SECONDS)
+
+
+def _token_cache_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
+
+
+def forget_decoded_token(token: str) -> None:
+    """Drop a token from the validation cache (e.g. on logout)."""
+    _decoded_token_cache.pop(_token_cache_key(token))
+
+
 def decode_token(token: str) -> Optional[dict]:
+    """
+    Decode and validate JWT, reusing the result for tokens validated in the last few seconds.
+    """
+    cache_key = _token_cache_key(token)
+    payload = _decoded_token_cache.get(cache_key)
+    if payload is not None:
+        return payload
+    payload = _decode_token_uncached(token)
+    if payload is not None:
+        ttl = float(_DECODED_TOKEN_TTL_SECONDS)
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            ttl = min(ttl, exp - time.time())
+        _decoded_token_cache.set(cache_key, payload, ttl=ttl)
+    return payload
+
+
+def _decode_token_uncached(token: str) -> Optional[dict]:
     """Decode and validate JWT. Uses OIDC JWKS if issuer is set, else JWT secret."""
     try:
         if settings.oidc_issuer_url:
             # Try OIDC JWKS validation first (for tokens from Keycloak)
             key_data = _get_signing_key_from_jwks(token, settings.oidc_issuer_url)
             if key_data:
-                key = jwk.construct(key_data)
+                key = PyJWK(key_data).key
                 payload = jwt.decode(
                     token,
                     key,
@@ -90,7 +126,7 @@ def decode_token(token: str) -> Optional[dict]:
             algorithms=[settings.jwt_algorithm],
         )
         return payload
-    except JWTError:
+    except PyJWTError:
         return None
 
 
@@ -148,13 +184,9 @@ def create_device_token(node_id: int, version: int) -> str:
 
     Payload: sub=device, node_id=N, ver=version
     """
-    exp = datetime.utcnow() + timedelta(days=settings.device_token_expiration_days)
+    exp = int(time.time()) + settings.device_token_expiration_days * 86400
     payload = {"sub": "device", "node_id": node_id, "ver": version, "exp": exp}
-    return jwt.encode(
-        payload,
-        settings.jwt_secret_key,
-        algorithm=settings.jwt_algorithm,
-    )
+    return encode_token(payload)
 
 
 def decode_device_token(token: str) -> Optional[tuple[int, int]]:
@@ -173,7 +205,7 @@ def decode_device_token(token: str) -> Optional[tuple[int, int]]:
         # Tokens issued before versioning did not include \"ver\"; treat them as version 1.
         version = payload.get("ver", 1)
         return int(node_id), int(version)
-    except JWTError:
+    except PyJWTError:
         return None
 
 
@@ -204,9 +236,9 @@ async def require_device_token(
     node_id, token_version = decoded
 
     # Enforce that the token version matches the current version stored on the node.
-    result = await session.execute(select(Node).where(Node.id == node_id))
-    node = result.scalar_one_or_none()
-    if not node or (node.device_token_version or 1) != token_version:
+    result = await session.execute(select(Node.device_token_version).where(Node.id == node_id))
+    row = result.first()
+    if row is None or (row.device_token_version or 1) != token_version:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid or expired device token",
@@ -4,14 +4,24 @@ Permission checking functions for role-based access control.
 from datetime import datetime
 from typing import Annotated, Optional
 
-from fastapi import Depends, HTTPException, status
-from sqlalchemy import select
+from fastapi import Depends, HTTPException, Request, status
+from sqlalchemy import event, exists, false, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
 from ..database import get_session
-from ..models.db import AccessGrant, NetworkPermission, NodePermission, Network, Node
+from ..models.db import AccessGrant, NetworkPermission, NodePermission, Network, Node, User
+from ..utils.ttl_cache import TTLCache
 from .oidc import require_user, UserInfo
 
+# (user_id, network_id, permission) -> bool, including negative results. Cleared when a
+# NetworkPermission change commits; the generation keeps a check that raced with that
+# commit from storing its pre-commit answer. Single-process only, like the other caches.
+_PERMISSION_CACHE_MAXSIZE = 10000
+_PERMISSION_CACHE_TTL_SECONDS = 60
+_permission_cache = TTLCache(_PERMISSION_CACHE_MAXSIZE, _PERMISSION_CACHE_TTL_SECONDS)
+_permission_generation = 0
+
 
 async def require_system_admin(
     user: Annotated[UserInfo, Depends(require_user)]
@@ -25,6 +35,53 @@ async def require_system_admin(
     return user
 
 
+async def get_db_user(
+    request: Request,
+    session: AsyncSession,
+    user: UserInfo,
+) -> Optional[User]:
+    """
+    Resolve the database User for the authenticated principal.
+
+    The result is cached on request.state so helpers called within the same
+    request reuse it instead of repeating the oidc_sub lookup.
+    """
+    cached = getattr(request.state, "db_user", None)
+    if cached is not None and cached.oidc_sub == user.sub:
+        return cached
+    result = await session.execute(select(User).where(User.oidc_sub == user.sub))
+    db_user = result.scalar_one_or_none()
+    request.state.db_user = db_user
+    return db_user
+
+
+def _network_permission_predicate(permission: str):
+    """SQL condition on NetworkPermission matching the given permission name."""
+    is_owner = NetworkPermission.role == "owner"
+    if permission == "owner":
+        return is_owner
+    elif permission in ("manage_nodes", "can_manage_nodes"):
+        return or_(is_owner, NetworkPermission.can_manage_nodes.is_(True))
+    elif permission in ("invite_users", "can_invite_users"):
+        return or_(is_owner, NetworkPermission.can_invite_users.is_(True))
+    elif permission in ("manage_firewall", "can_manage_firewall"):
+        return or_(is_owner, NetworkPermission.can_manage_firewall.is_(True))
+    return false()
+
+
+def network_permission_exists(user_id: int, network_id, permission: str):
+    """
+    EXISTS clause that is true when the user holds the permission on the network.
+    network_id may be a value or a column (e.g. Node.network_id) to correlate
+    the check into a larger query.
+    """
+    return exists().where(
+        NetworkPermission.user_id == user_id,
+        NetworkPermission.network_id == network_id,
+        _network_permission_predicate(permission),
+    )
+
+
 async def check_network_permission(
     user_id: int,
     network_id: int,
@@ -43,26 +100,55 @@ async def check_network_permission(
     Returns:
         True if user has permission, False otherwise
     """
-    stmt = select(NetworkPermission).where(
-        NetworkPermission.user_id == user_id,
-        NetworkPermission.network_id == network_id
+    stmt = select(network_permission_exists(user_id, network_id, permission))
+    # This session's own uncommitted permission changes are not reflected in the cache
+    if _has_pending_permission_changes(session):
+        return bool(await session.scalar(stmt))
+    key = (user_id, network_id, permission)
+    cached = _permission_cache.get(key)
+    if cached is not None:
+        return cached
+    generation = _permission_generation
+    allowed = bool(await session.scalar(stmt))
+    if generation == _permission_generation:
+        _permission_cache.set(key, allowed)
+    return allowed
+
+
+def invalidate_permission_cache() -> None:
+    """Drop all cached network permission checks (e.g. after changing permissions outside the ORM)."""
+    global _permission_generation
+    _permission_generation += 1
+    _permission_cache.clear()
+
+
+def _has_pending_permission_changes(session: AsyncSession) -> bool:
+    if session.info.get("network_permissions_changed"):
+        return True
+    return any(
+        isinstance(obj, NetworkPermission)
+        for obj in (*session.new, *session.dirty, *session.deleted)
     )
-    result = await session.execute(stmt)
-    perm = result.scalar_one_or_none()
-    
-    if not perm:
-        return False
-    
-    if permission == "owner":
-        return perm.role == "owner"
-    elif permission in ("manage_nodes", "can_manage_nodes"):
-        return perm.role == "owner" or perm.can_manage_nodes
-    elif permission in ("invite_users", "can_invite_users"):
-        return perm.role == "owner" or perm.can_invite_users
-    elif permission in ("manage_firewall", "can_manage_firewall"):
-        return perm.role == "owner" or perm.can_manage_firewall
-    
-    return False
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_permission_changes(session, flush_context) -> None:
+    if any(
+        isinstance(obj, NetworkPermission)
+        for obj in (*session.new, *session.dirty, *session.deleted)
+    ):
+        session.info["network_permissions_changed"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_permission_changes(session) -> None:
+    if session.info.pop("network_permissions_changed", False):
+        invalidate_permission_cache()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_permission_changes(session) -> None:
+    session.info.pop("network_permissions_changed", None)
 
 
 async def check_node_permission(
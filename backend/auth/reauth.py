@@ -1,17 +1,34 @@
 """
 Reauthentication flow for critical operations.
 """
+import heapq
 import secrets
-from datetime import datetime, timedelta
+import time
 from typing import Optional
 
-from jose import jwt
+import jwt
 
 from ..config import settings
+from .tokens import encode_token
+
+# Challenges are valid for 5 minutes from creation
+_REAUTH_CHALLENGE_TTL_SECONDS = 5 * 60
 
 # In-memory cache for reauth challenges (sub -> challenge_data)
 # In production, this should be Redis or similar
 _reauth_challenges: dict[str, dict] = {}
+# Min-heap of (expires_at, sub, challenge) for lazy cleanup of abandoned challenges.
+# Times are time.monotonic() values.
+_expiry_heap: list[tuple[float, str, str]] = []
+
+
+def _purge_expired(now: float) -> None:
+    """Drop expired challenges from the heap top; stale heap entries are skipped."""
+    while _expiry_heap and _expiry_heap[0][0] <= now:
+        _, user_sub, challenge = heapq.heappop(_expiry_heap)
+        data = _reauth_challenges.get(user_sub)
+        if data is not None and data["challenge"] == challenge:
+            del _reauth_challenges[user_sub]
 
 
 def create_reauth_challenge(user_sub: str) -> str:
@@ -25,7 +42,10 @@ def create_reauth_challenge(user_sub: str) -> str:
         Challenge token to be validated after reauth
     """
     challenge = secrets.token_urlsafe(32)
-    expires_at = datetime.utcnow() + timedelta(minutes=5)
+    now = time.monotonic()
+    _purge_expired(now)
+    expires_at = now + _REAUTH_CHALLENGE_TTL_SECONDS
+    heapq.heappush(_expiry_heap, (expires_at, user_sub, challenge))
     
     _reauth_challenges[user_sub] = {
         "challenge": challenge,
@@ -56,12 +76,13 @@ def mark_reauth_completed(user_sub: str, challenge: str) -> bool:
     if data["challenge"] != challenge:
         return False
     
-    if datetime.utcnow() > data["expires_at"]:
+    now = time.monotonic()
+    if now > data["expires_at"]:
         del _reauth_challenges[user_sub]
         return False
     
     # Mark as authenticated
-    data["authenticated_at"] = datetime.utcnow()
+    data["authenticated_at"] = now
     return True
 
 
@@ -90,7 +111,7 @@ def verify_reauth(user_sub: str, challenge: str) -> bool:
         return False
     
     # Check if still valid (5 minutes from authentication)
-    if datetime.utcnow() > data["expires_at"]:
+    if time.monotonic() > data["expires_at"]:
         del _reauth_challenges[user_sub]
         return False
     
@@ -119,18 +140,14 @@ def create_reauth_token(user_sub: str, challenge: str) -> str:
     Returns:
         JWT token
     """
-    expires = datetime.utcnow() + timedelta(minutes=5)
+    expires = int(time.time()) + _REAUTH_CHALLENGE_TTL_SECONDS
     payload = {
         "sub": user_sub,
         "challenge": challenge,
         "reauth": True,
         "exp": expires,
     }
-    return jwt.encode(
-        payload,
-        settings.jwt_secret_key,
-        algorithm=settings.jwt_algorithm,
-    )
+    return encode_token(payload)
 
 
 def decode_reauth_token(token: str) -> Optional[dict]:
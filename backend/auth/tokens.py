@@ -0,0 +1,63 @@
+"""
+JWT signing for tokens issued by Nebula Commander (session, device and reauth tokens).
+
+For the HMAC algorithms the header segment is serialized once and the keyed HMAC
+state is cached, so issuing a token is one payload serialization plus one HMAC.
+Other algorithms fall back to PyJWT.
+"""
+import base64
+import calendar
+from datetime import datetime
+from functools import lru_cache
+from typing import Any
+
+import jwt
+import orjson
+from cryptography.hazmat.primitives import hashes, hmac
+
+from ..config import settings
+
+_HMAC_DIGESTS = {
+    "HS256": hashes.SHA256,
+    "HS384": hashes.SHA384,
+    "HS512": hashes.SHA512,
+}
+
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+@lru_cache(maxsize=8)
+def _header_b64(algorithm: str) -> bytes:
+    """Pre-serialized header segment for the given algorithm."""
+    return _b64url(orjson.dumps({"alg": algorithm, "typ": "JWT"}))
+
+
+@lru_cache(maxsize=8)
+def _hmac_prototype(key: str, algorithm: str) -> "hmac.HMAC":
+    """Keyed OpenSSL HMAC context; callers copy() it instead of re-keying per token."""
+    return hmac.HMAC(key.encode("utf-8"), _HMAC_DIGESTS[algorithm]())
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        # Naive datetimes are UTC throughout the app (same conversion as PyJWT)
+        return calendar.timegm(value.utctimetuple())
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_token(payload: dict) -> str:
+    """Sign payload with the configured JWT secret and algorithm."""
+    algorithm = settings.jwt_algorithm
+    if algorithm not in _HMAC_DIGESTS:
+        return jwt.encode(payload, settings.jwt_secret_key, algorithm=algorithm)
+
+    signing_input = (
+        _header_b64(algorithm)
+        + b"."
+        + _b64url(orjson.dumps(payload, default=_json_default, option=orjson.OPT_PASSTHROUGH_DATETIME))
+    )
+    mac = _hmac_prototype(settings.jwt_secret_key, algorithm).copy()
+    mac.update(signing_input)
+    return (signing_input + b"." + _b64url(mac.finalize())).decode("ascii")
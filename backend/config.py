@@ -2,6 +2,7 @@
 Application configuration for Nebula Commander
 """
 import os
+from functools import cached_property
 from typing import Optional
 from urllib.parse import urlparse
 
@@ -33,6 +34,13 @@ class Settings(BaseSettings):
     # Database (SQLite by default). Use four slashes for absolute path so DB is at /var/lib/... not CWD/var/lib/...
     database_url: str = "sqlite+aiosqlite:////var/lib/nebula-commander/db.sqlite"
     database_path: Optional[str] = None  # Override for SQLite path
+    # Connection pool (server databases only; SQLite keeps SQLAlchemy's defaults)
+    database_pool_size: int = 20
+    database_max_overflow: int = 10
+    database_pool_recycle: int = 300  # seconds
+    database_pool_pre_ping: bool = True
+    database_pool_timeout: int = 30  # seconds to wait for a pooled connection
+    database_null_pool: bool = False  # True behind pgbouncer: let it do the pooling
 
     # Certificate store
     cert_store_path: str = "/var/lib/nebula-commander/certs"
@@ -90,6 +98,8 @@ class Settings(BaseSettings):
     smtp_use_tls: bool = True
     smtp_from_email: str = "noreply@example.com"
     smtp_from_name: str = "Nebula Commander"
+    smtp_timeout: int = 30  # seconds per SMTP connect/command
+    smtp_send_attempts: int = 3  # tries per email; transient SMTP/network errors back off 2s, 4s, ...
 
     # Analytics (optional). Exposed to frontend via GET /api/public-config for script injection.
     plausible_domain: Optional[str] = None  # e.g. nebulacdr.net
@@ -127,6 +137,28 @@ class Settings(BaseSettings):
                 self.allowed_redirect_hosts = [netloc]
         return self
 
+    @property
+    def jwt_expiration_seconds(self) -> int:
+        """Session JWT lifetime in seconds (for epoch-based exp claims)."""
+        return self.jwt_expiration_minutes * 60
+
+    @cached_property
+    def oidc_public_issuer_base(self) -> str:
+        """Browser-facing issuer URL (public URL if set, else issuer URL) without trailing slash."""
+        return (self.oidc_public_issuer_url or self.oidc_issuer_url or "").rstrip("/")
+
+    @cached_property
+    def oidc_authorize_url(self) -> str:
+        return f"{self.oidc_public_issuer_base}/protocol/openid-connect/auth"
+
+    @cached_property
+    def oidc_token_url(self) -> str:
+        return f"{self.oidc_public_issuer_base}/protocol/openid-connect/token"
+
+    @cached_property
+    def oidc_logout_url(self) -> str:
+        return f"{self.oidc_public_issuer_base}/protocol/openid-connect/logout"
+
     class Config:
         env_prefix = "NEBULA_COMMANDER_"
         env_file = "/etc/nebula-commander/config.env"
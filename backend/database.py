@@ -8,6 +8,7 @@ from pathlib import Path
 from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.pool import NullPool
 from sqlalchemy.types import TypeDecorator, Text
 
 from .config import settings
@@ -22,10 +23,32 @@ if _db_url.startswith("sqlite"):
     if path_part and not path_part.startswith(":"):
         Path(path_part).parent.mkdir(parents=True, exist_ok=True)
 
+_engine_kwargs: dict = {}
+if not _db_url.startswith("sqlite"):
+    if settings.database_null_pool:
+        # An external pooler (pgbouncer, transaction mode) owns the connections
+        _engine_kwargs["poolclass"] = NullPool
+    else:
+        # Keep warm connections to server databases instead of reconnecting under load
+        _engine_kwargs.update(
+            pool_size=settings.database_pool_size,
+            max_overflow=settings.database_max_overflow,
+            pool_timeout=settings.database_pool_timeout,
+            pool_recycle=settings.database_pool_recycle,
+            pool_pre_ping=settings.database_pool_pre_ping,
+        )
+    if "+asyncpg" in _db_url:
+        connect_args: dict = {"server_settings": {"jit": "off"}, "command_timeout": 60}
+        if settings.database_null_pool:
+            # Prepared statements do not survive pgbouncer transaction pooling
+            connect_args["statement_cache_size"] = 0
+        _engine_kwargs["connect_args"] = connect_args
+
 engine = create_async_engine(
     _db_url,
     echo=settings.debug,
     future=True,
+    **_engine_kwargs,
 )
 
 # SQLite: ensure commits are durable and use WAL for better concurrent read behavior
@@ -341,6 +364,102 @@ def _run_sqlite_migrations() -> None:
                     "ALTER TABLE network_dns_configs ADD COLUMN upstream_servers TEXT"
                 )
                 logger.info("Migration: added column network_dns_configs.upstream_servers")
+
+        # Partial indexes for active access grant listings
+        cur.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='access_grants'"
+        )
+        if cur.fetchone() is not None:
+            cur.execute(
+                "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='access_grants'"
+            )
+            grant_indexes = {row[0] for row in cur.fetchall()}
+            for name, sql in [
+                (
+                    "ix_access_grants_admin_active",
+                    "CREATE INDEX ix_access_grants_admin_active ON access_grants "
+                    "(admin_user_id, expires_at) WHERE revoked_at IS NULL",
+                ),
+                (
+                    "ix_access_grants_granter_active",
+                    "CREATE INDEX ix_access_grants_granter_active ON access_grants "
+                    "(granted_by_user_id, expires_at) WHERE revoked_at IS NULL",
+                ),
+            ]:
+                if name not in grant_indexes:
+                    cur.execute(sql)
+                    logger.info("Migration: created index %s", name)
+
+        # Enrollment codes are stored as keyed digests; hash plaintext/encrypted codes left from
+        # older versions (64-char hex values are already digests)
+        cur.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name='enrollment_codes'"
+        )
+        if cur.fetchone() is not None:
+            from .services.encryption import decrypt_to_str_or_plain, enrollment_code_digest
+            cur.execute("SELECT id, code FROM enrollment_codes")
+            hashed = 0
+            for row_id, stored in cur.fetchall():
+                if len(stored) == 64 and all(c in "0123456789abcdef" for c in stored):
+                    continue
+                digest = enrollment_code_digest(decrypt_to_str_or_plain(stored))
+                cur.execute("UPDATE enrollment_codes SET code = ? WHERE id = ?", (digest, row_id))
+                hashed += 1
+            if hashed:
+                logger.info("Migration: hashed %d enrollment codes", hashed)
+
+        # One pending invitation per (email, network): revoke older duplicate pending rows,
+        # then add the partial unique index that enforces it
+        cur.execute(
+            "SELECT name FROM sqlite_master WHERE type='index' AND name='uq_invitation_pending_email_network'"
+        )
+        if cur.fetchone() is None:
+            cur.execute(
+                "UPDATE invitations SET status = 'revoked' WHERE status = 'pending' AND id NOT IN "
+                "(SELECT MAX(id) FROM invitations WHERE status = 'pending' GROUP BY email, network_id)"
+            )
+            if cur.rowcount:
+                logger.info("Migration: revoked %d duplicate pending invitations", cur.rowcount)
+            cur.execute(
+                "CREATE UNIQUE INDEX uq_invitation_pending_email_network ON invitations "
+                "(email, network_id) WHERE status = 'pending'"
+            )
+            logger.info("Migration: created index uq_invitation_pending_email_network")
+
+        # One allocation per (network, ip): duplicate rows are redundant, so keep the oldest
+        # and add the unique index backing the model's UniqueConstraint
+        cur.execute(
+            "SELECT name FROM sqlite_master WHERE type='index' AND name='uq_allocated_ip_network_ip'"
+        )
+        if cur.fetchone() is None:
+            cur.execute(
+                "DELETE FROM allocated_ips WHERE id NOT IN "
+                "(SELECT MIN(id) FROM allocated_ips GROUP BY network_id, ip_address)"
+            )
+            if cur.rowcount:
+                logger.info("Migration: removed %d duplicate allocated_ips rows", cur.rowcount)
+            cur.execute(
+                "CREATE UNIQUE INDEX uq_allocated_ip_network_ip ON allocated_ips (network_id, ip_address)"
+            )
+            logger.info("Migration: created index uq_allocated_ip_network_ip")
+
+        # Unique indexes backing model UniqueConstraints (SQLite cannot add a table constraint)
+        for name, table, columns in [
+            ("uq_node_network_hostname", "nodes", "network_id, hostname"),
+        ]:
+            cur.execute(
+                "SELECT name FROM sqlite_master WHERE type='index' AND name=?", (name,)
+            )
+            if cur.fetchone() is not None:
+                continue
+            try:
+                cur.execute(f"CREATE UNIQUE INDEX {name} ON {table} ({columns})")
+                logger.info("Migration: created index %s", name)
+            except sqlite3.IntegrityError:
+                logger.warning(
+                    "Migration: %s has duplicate (%s) rows; %s not created until they are removed",
+                    table, columns, name,
+                )
         
         conn.commit()
     finally:
@@ -10,6 +10,7 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from starlette.middleware.sessions import SessionMiddleware
 
 from .config import settings
@@ -31,6 +32,8 @@ from .api import (
     dns,
 )
 from .middleware import RateLimitMiddleware
+from .services.audit import start_audit_writer, stop_audit_writer
+from .services.heartbeats import start_heartbeat_writer, stop_heartbeat_writer
 
 logging.basicConfig(
     level=logging.DEBUG if settings.debug else logging.INFO,
@@ -42,7 +45,7 @@ logger = logging.getLogger(__name__)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Application lifespan: init DB on startup."""
+    """Application lifespan: init DB, audit and heartbeat writers and OIDC client on startup."""
     logger.info("Starting %s...", settings.app_name)
     
     # Warn if dev-token is available
@@ -56,8 +59,14 @@ async def lifespan(app: FastAPI):
             )
     
     await init_db()
+    await start_audit_writer(app)
+    await start_heartbeat_writer(app)
+    await auth.init_oauth_client(app)
     yield
     logger.info("Shutting down...")
+    await auth.shutdown_oauth_client(app)
+    await stop_heartbeat_writer(app)
+    await stop_audit_writer(app)
 
 
 VERSION = os.getenv("VERSION", "0.1.8")
@@ -67,6 +76,7 @@ app = FastAPI(
     version=VERSION,
     description="Self-hosted Nebula control plane",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
     docs_url="/api/docs",
     redoc_url="/api/redoc",
 )
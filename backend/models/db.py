@@ -14,6 +14,7 @@ from sqlalchemy import (
     Text,
     JSON,
     UniqueConstraint,
+    text,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
@@ -78,6 +79,9 @@ class Node(Base):
     """Nebula node (host) in a network."""
 
     __tablename__ = "nodes"
+    __table_args__ = (
+        UniqueConstraint("network_id", "hostname", name="uq_node_network_hostname"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     network_id: Mapped[int] = mapped_column(ForeignKey("networks.id"), nullable=False)
@@ -175,7 +179,8 @@ class EnrollmentCode(Base):
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     node_id: Mapped[int] = mapped_column(ForeignKey("nodes.id"), nullable=False)
-    code: Mapped[str] = mapped_column(EncryptedText(), unique=True, nullable=False)
+    # Keyed BLAKE2b hex digest of the code (see enrollment_code_digest); plaintext is only shown once
+    code_hash: Mapped[str] = mapped_column("code", String(64), unique=True, nullable=False)
     expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
     used_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
@@ -187,6 +192,9 @@ class AllocatedIP(Base):
     """IP address allocation for a network (tracks used IPs)."""
 
     __tablename__ = "allocated_ips"
+    __table_args__ = (
+        UniqueConstraint("network_id", "ip_address", name="uq_allocated_ip_network_ip"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     network_id: Mapped[int] = mapped_column(ForeignKey("networks.id"), nullable=False)
@@ -272,6 +280,23 @@ class AccessGrant(Base):
     """Temporary system admin access to a resource."""
 
     __tablename__ = "access_grants"
+    __table_args__ = (
+        # Partial indexes for the active-grant listings (per admin and per granter)
+        Index(
+            "ix_access_grants_admin_active",
+            "admin_user_id",
+            "expires_at",
+            sqlite_where=text("revoked_at IS NULL"),
+            postgresql_where=text("revoked_at IS NULL"),
+        ),
+        Index(
+            "ix_access_grants_granter_active",
+            "granted_by_user_id",
+            "expires_at",
+            sqlite_where=text("revoked_at IS NULL"),
+            postgresql_where=text("revoked_at IS NULL"),
+        ),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     admin_user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
@@ -374,6 +399,18 @@ class Invitation(Base):
     network: Mapped["Network"] = relationship("Network")
     invited_by_user: Mapped["User"] = relationship("User", foreign_keys=[invited_by_user_id])
 
+    __table_args__ = (
+        # At most one pending invitation per email and network; enforced by the database
+        Index(
+            "uq_invitation_pending_email_network",
+            "email",
+            "network_id",
+            unique=True,
+            sqlite_where=text("status = 'pending'"),
+            postgresql_where=text("status = 'pending'"),
+        ),
+    )
+
 
 class AuditLog(Base):
     """Structured audit log for sensitive actions. Visible to system admins only."""
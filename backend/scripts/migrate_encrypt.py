@@ -67,16 +67,7 @@ def migrate_db(settings):
     if n:
         print(f"Encrypted {n} node(s) public_key")
 
-    # enrollment_codes.code
-    cur.execute("SELECT id, code FROM enrollment_codes")
-    n = 0
-    for row in cur.fetchall():
-        val = row["code"]
-        if not _is_encrypted(val):
-            cur.execute("UPDATE enrollment_codes SET code = ? WHERE id = ?", (encrypt_to_str(val), row["id"]))
-            n += 1
-    if n:
-        print(f"Encrypted {n} enrollment_code(s)")
+    # enrollment_codes.code holds keyed BLAKE2b digests (hashed at startup), not secrets to encrypt
 
     # invitations.token
     cur.execute("SELECT id, token FROM invitations")
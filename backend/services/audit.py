@@ -3,13 +3,26 @@ Audit logging for sensitive actions. Entries are visible to system admins only.
 """
 from __future__ import annotations
 
+import asyncio
 import json
-from typing import Optional
+import logging
+from typing import Any, Optional
 
 from fastapi import Request
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ..database import AsyncSessionLocal
 from ..models.db import AuditLog
+from ..utils.timeutils import utcnow
+
+logger = logging.getLogger(__name__)
+
+# Entries queued by enqueue_audit() and written in batches by the background writer
+_AUDIT_QUEUE_MAXSIZE = 10000
+_AUDIT_BATCH_SIZE = 100
+_AUDIT_BATCH_WINDOW_SECONDS = 0.1
+_audit_queue: asyncio.Queue[Optional[dict[str, Any]]] = asyncio.Queue(maxsize=_AUDIT_QUEUE_MAXSIZE)
 
 
 def get_client_ip(request: Request) -> str:
@@ -37,10 +50,6 @@ async def log_audit(
     """
     Append one audit log entry. Does not commit; caller must commit the session.
     """
-    details_str: Optional[str] = None
-    if details is not None:
-        details_str = json.dumps(details) if isinstance(details, dict) else details
-
     entry = AuditLog(
         action=action,
         actor_user_id=actor_user_id,
@@ -48,7 +57,107 @@ async def log_audit(
         resource_type=resource_type,
         resource_id=resource_id,
         result=result,
-        details=details_str,
+        details=_details_str(details),
         client_ip=client_ip,
     )
     session.add(entry)
+
+
+def enqueue_audit(
+    action: str,
+    *,
+    resource_type: Optional[str] = None,
+    resource_id: Optional[int] = None,
+    result: str = "success",
+    actor_user_id: Optional[int] = None,
+    actor_identifier: Optional[str] = None,
+    details: Optional[str] | Optional[dict] = None,
+    client_ip: Optional[str] = None,
+) -> None:
+    """
+    Queue one audit log entry for the background writer instead of writing it in the
+    request's transaction. Use log_audit() where the entry must commit with the change.
+    """
+    entry = {
+        "occurred_at": utcnow(),
+        "action": action,
+        "actor_user_id": actor_user_id,
+        "actor_identifier": actor_identifier,
+        "resource_type": resource_type,
+        "resource_id": resource_id,
+        "result": result,
+        "details": _details_str(details),
+        "client_ip": client_ip,
+    }
+    try:
+        _audit_queue.put_nowait(entry)
+    except asyncio.QueueFull:
+        logger.error("Audit queue full; dropping %s entry for %s", action, actor_identifier)
+
+
+def _details_str(details: Optional[str] | Optional[dict]) -> Optional[str]:
+    if details is None:
+        return None
+    return json.dumps(details) if isinstance(details, dict) else details
+
+
+async def _next_audit_batch() -> tuple[list[dict[str, Any]], bool]:
+    """
+    Wait for one entry, then collect more for up to the batch window or batch size.
+    Returns the batch and whether the shutdown sentinel (None) was seen.
+    """
+    first = await _audit_queue.get()
+    if first is None:
+        return [], True
+    batch = [first]
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + _AUDIT_BATCH_WINDOW_SECONDS
+    while len(batch) < _AUDIT_BATCH_SIZE:
+        try:
+            entry = _audit_queue.get_nowait()
+        except asyncio.QueueEmpty:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                entry = await asyncio.wait_for(_audit_queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+        if entry is None:
+            return batch, True
+        batch.append(entry)
+    return batch, False
+
+
+async def _write_audit_batch(batch: list[dict[str, Any]]) -> None:
+    if not batch:
+        return
+    try:
+        async with AsyncSessionLocal() as session:
+            await session.execute(insert(AuditLog), batch)
+            await session.commit()
+    except Exception:
+        logger.exception("Failed to write %d audit log entries", len(batch))
+
+
+async def _audit_writer() -> None:
+    """Write queued audit entries in batches until the shutdown sentinel is dequeued."""
+    stopping = False
+    while not stopping:
+        batch, stopping = await _next_audit_batch()
+        await _write_audit_batch(batch)
+
+
+async def start_audit_writer(app) -> None:
+    """Start the background task that writes queued audit entries."""
+    app.state.audit_writer_task = asyncio.create_task(_audit_writer())
+
+
+async def stop_audit_writer(app) -> None:
+    """Flush entries still queued, then stop the background writer."""
+    task = getattr(app.state, "audit_writer_task", None)
+    if task is None:
+        return
+    # Entries queued before the sentinel are written before the writer exits
+    await _audit_queue.put(None)
+    await task
@@ -0,0 +1,32 @@
+"""
+Batch lookups for list endpoints: fetch every referenced row with one IN query instead
+of one SELECT per list item.
+"""
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from ..models import Network, User
+
+
+def _distinct_ids(ids: Iterable[Optional[int]]) -> set[int]:
+    return {i for i in ids if i is not None}
+
+
+async def batch_fetch_networks(session: AsyncSession, ids: Iterable[Optional[int]]) -> dict[int, Network]:
+    """Return {network_id: Network} for the given ids (None and missing ids are skipped)."""
+    wanted = _distinct_ids(ids)
+    if not wanted:
+        return {}
+    result = await session.execute(select(Network).where(Network.id.in_(wanted)))
+    return {network.id: network for network in result.scalars().all()}
+
+
+async def batch_fetch_users(session: AsyncSession, ids: Iterable[Optional[int]]) -> dict[int, User]:
+    """Return {user_id: User} for the given ids (None and missing ids are skipped)."""
+    wanted = _distinct_ids(ids)
+    if not wanted:
+        return {}
+    result = await session.execute(select(User).where(User.id.in_(wanted)))
+    return {user.id: user for user in result.scalars().all()}
@@ -2,24 +2,136 @@
 Certificate management: CA creation, signing with betterkeys (client public key),
 and full certificate creation (server-generated keypair).
 """
-import tempfile
+import asyncio
 import logging
-from datetime import datetime, timedelta
+import tempfile
+from datetime import timedelta
 from pathlib import Path
 from typing import Optional
 
+from fastapi import Depends
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..config import settings
+from ..database import get_session
 from ..models import Network, Node, Certificate, AllocatedIP
 from ..utils.nebula_cert import _check_path_under_roots, ca_generate, cert_sign, keygen
-from .cert_store import read_cert_store_file, write_cert_store_file
+from .cert_store import read_cert_store_file, read_cert_store_file_cached, write_cert_store_file
 from .ip_allocator import IPAllocator
+from ..utils.timeutils import utcnow
 
 logger = logging.getLogger(__name__)
 
 
+# Blocking parts of issuance (nebula-cert subprocesses, file I/O, encryption). CertManager
+# runs these via asyncio.to_thread so the event loop keeps serving other requests.
+
+
+def _generate_ca_files(name: str, ca_crt: Path, ca_key: Path) -> None:
+    ca_generate(
+        name,
+        ca_crt,
+        ca_key,
+        allowed_roots=[Path(settings.cert_store_path)],
+    )
+    # Overwrite with encrypted storage
+    write_cert_store_file(ca_crt, ca_crt.read_text())
+    write_cert_store_file(ca_key, ca_key.read_text())
+
+
+def _sign_public_key(
+    ca_cert_path: str,
+    ca_key_path: str,
+    subnet_cidr: str,
+    name: str,
+    ip: str,
+    public_key_pem: str,
+    groups: list[str],
+    duration_hours: int,
+    out_crt: Path,
+) -> str:
+    """Sign a client-supplied public key; store the cert encrypted at out_crt and return its PEM."""
+    with tempfile.NamedTemporaryFile(
+        mode="w", suffix=".pub", delete=False
+    ) as f:
+        f.write(public_key_pem)
+        pub_path = Path(f.name)
+    try:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tmp = Path(tmpdir)
+            ca_crt_tmp = tmp / "ca.crt"
+            ca_key_tmp = tmp / "ca.key"
+            ca_crt_tmp.write_text(read_cert_store_file(Path(ca_cert_path)))
+            ca_key_tmp.write_text(read_cert_store_file(Path(ca_key_path)))
+            _roots = [Path(settings.cert_store_path), Path(tempfile.gettempdir())]
+            cert_sign(
+                ca_crt_tmp,
+                ca_key_tmp,
+                name=name,
+                ip=ip,
+                out_crt=out_crt,
+                groups=groups,
+                duration_hours=duration_hours,
+                in_pub=pub_path,
+                subnet_cidr=subnet_cidr,
+                allowed_roots=_roots,
+            )
+        _check_path_under_roots(out_crt, [Path(settings.cert_store_path)])
+        cert_pem = out_crt.read_text()  # lgtm [py/path-injection] Path validated above.
+        write_cert_store_file(out_crt, cert_pem)
+    finally:
+        pub_path.unlink(missing_ok=True)
+    return cert_pem
+
+
+def _generate_and_sign(
+    ca_cert_path: str,
+    ca_key_path: str,
+    subnet_cidr: str,
+    name: str,
+    ip: str,
+    groups: list[str],
+    duration_hours: int,
+    base: Path,
+) -> tuple[str, str, str]:
+    """
+    Generate a keypair, sign it, store cert and key encrypted under base.
+    Returns (cert_pem, private_key_pem, public_key_pem).
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = Path(tmpdir)
+        pub_path = tmp / "host.pub"
+        key_path = tmp / "host.key"
+        out_crt_tmp = tmp / "host.crt"
+        ca_crt_tmp = tmp / "ca.crt"
+        ca_key_tmp = tmp / "ca.key"
+        ca_crt_tmp.write_text(read_cert_store_file(Path(ca_cert_path)))
+        ca_key_tmp.write_text(read_cert_store_file(Path(ca_key_path)))
+        _roots = [Path(settings.cert_store_path), Path(tempfile.gettempdir())]
+        keygen(out_pub=pub_path, out_key=key_path, allowed_roots=_roots)
+        cert_sign(
+            ca_crt_tmp,
+            ca_key_tmp,
+            name=name,
+            ip=ip,
+            out_crt=out_crt_tmp,
+            groups=groups,
+            duration_hours=duration_hours,
+            in_pub=pub_path,
+            subnet_cidr=subnet_cidr,
+            allowed_roots=_roots,
+        )
+        cert_pem = out_crt_tmp.read_text()
+        private_key_pem = key_path.read_text()
+        public_key_pem = pub_path.read_text()
+
+    # Persist encrypted
+    write_cert_store_file(base / f"{name}.crt", cert_pem)
+    write_cert_store_file(base / f"{name}.key", private_key_pem)
+    return cert_pem, private_key_pem, public_key_pem
+
+
 class CertManager:
     """Issue and manage Nebula certificates with betterkeys and IP allocation."""
 
@@ -41,16 +153,7 @@ class CertManager:
             network.ca_key_path = str(ca_key)
             await self.session.flush()
             return
-        _cert_store_root = Path(settings.cert_store_path)
-        ca_generate(
-            network.name,
-            ca_crt,
-            ca_key,
-            allowed_roots=[_cert_store_root],
-        )
-        # Overwrite with encrypted storage
-        write_cert_store_file(ca_crt, ca_crt.read_text())
-        write_cert_store_file(ca_key, ca_key.read_text())
+        await asyncio.to_thread(_generate_ca_files, network.name, ca_crt, ca_key)
         network.ca_cert_path = str(ca_crt)
         network.ca_key_path = str(ca_key)
         await self.session.flush()
@@ -79,37 +182,18 @@ class CertManager:
         base = Path(settings.cert_store_path) / str(network.id) / "hosts"
         base.mkdir(parents=True, exist_ok=True)
         out_crt = base / f"{name}.crt"
-
-        with tempfile.NamedTemporaryFile(
-            mode="w", suffix=".pub", delete=False
-        ) as f:
-            f.write(public_key_pem)
-            pub_path = Path(f.name)
-        try:
-            with tempfile.TemporaryDirectory() as tmpdir:
-                tmp = Path(tmpdir)
-                ca_crt_tmp = tmp / "ca.crt"
-                ca_key_tmp = tmp / "ca.key"
-                ca_crt_tmp.write_text(read_cert_store_file(Path(network.ca_cert_path)))
-                ca_key_tmp.write_text(read_cert_store_file(Path(network.ca_key_path)))
-                _roots = [Path(settings.cert_store_path), Path(tempfile.gettempdir())]
-                cert_sign(
-                    ca_crt_tmp,
-                    ca_key_tmp,
-                    name=name,
-                    ip=ip,
-                    out_crt=out_crt,
-                    groups=groups or [],
-                    duration_hours=duration_hours,
-                    in_pub=pub_path,
-                    subnet_cidr=network.subnet_cidr,
-                    allowed_roots=_roots,
-                )
-            _check_path_under_roots(out_crt, [Path(settings.cert_store_path)])
-            cert_pem = out_crt.read_text()  # lgtm [py/path-injection] Path validated above.
-            write_cert_store_file(out_crt, cert_pem)
-        finally:
-            pub_path.unlink(missing_ok=True)
+        cert_pem = await asyncio.to_thread(
+            _sign_public_key,
+            network.ca_cert_path,
+            network.ca_key_path,
+            network.subnet_cidr,
+            name,
+            ip,
+            public_key_pem,
+            groups or [],
+            duration_hours,
+            out_crt,
+        )
 
         return ip, cert_pem
 
@@ -137,43 +221,22 @@ class CertManager:
 
         base = Path(settings.cert_store_path) / str(network.id) / "hosts"
         base.mkdir(parents=True, exist_ok=True)
-
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp = Path(tmpdir)
-            pub_path = tmp / "host.pub"
-            key_path = tmp / "host.key"
-            out_crt_tmp = tmp / "host.crt"
-            ca_crt_tmp = tmp / "ca.crt"
-            ca_key_tmp = tmp / "ca.key"
-            ca_crt_tmp.write_text(read_cert_store_file(Path(network.ca_cert_path)))
-            ca_key_tmp.write_text(read_cert_store_file(Path(network.ca_key_path)))
-            _roots = [Path(settings.cert_store_path), Path(tempfile.gettempdir())]
-            keygen(out_pub=pub_path, out_key=key_path, allowed_roots=_roots)
-            cert_sign(
-                ca_crt_tmp,
-                ca_key_tmp,
-                name=name,
-                ip=ip,
-                out_crt=out_crt_tmp,
-                groups=groups or [],
-                duration_hours=duration_hours,
-                in_pub=pub_path,
-                subnet_cidr=network.subnet_cidr,
-                allowed_roots=_roots,
-            )
-            cert_pem = out_crt_tmp.read_text()
-            private_key_pem = key_path.read_text()
-            public_key_pem = pub_path.read_text()
-
-        # Persist encrypted
-        write_cert_store_file(base / f"{name}.crt", cert_pem)
-        key_file = base / f"{name}.key"
-        write_cert_store_file(key_file, private_key_pem)
+        cert_pem, private_key_pem, public_key_pem = await asyncio.to_thread(
+            _generate_and_sign,
+            network.ca_cert_path,
+            network.ca_key_path,
+            network.subnet_cidr,
+            name,
+            ip,
+            groups or [],
+            duration_hours,
+            base,
+        )
 
         ca_pem = ""
         if network.ca_cert_path:
             try:
-                ca_pem = read_cert_store_file(Path(network.ca_cert_path))
+                ca_pem = read_cert_store_file_cached(Path(network.ca_cert_path))
             except FileNotFoundError:
                 logger.warning("CA cert file not found: %s", network.ca_cert_path)
             except PermissionError:
@@ -205,46 +268,25 @@ class CertManager:
 
         base = Path(settings.cert_store_path) / str(network.id) / "hosts"
         base.mkdir(parents=True, exist_ok=True)
-        name = node.hostname
-
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp = Path(tmpdir)
-            pub_path = tmp / "host.pub"
-            key_path = tmp / "host.key"
-            out_crt_tmp = tmp / "host.crt"
-            ca_crt_tmp = tmp / "ca.crt"
-            ca_key_tmp = tmp / "ca.key"
-            ca_crt_tmp.write_text(read_cert_store_file(Path(network.ca_cert_path)))
-            ca_key_tmp.write_text(read_cert_store_file(Path(network.ca_key_path)))
-            _roots = [Path(settings.cert_store_path), Path(tempfile.gettempdir())]
-            keygen(out_pub=pub_path, out_key=key_path, allowed_roots=_roots)
-            cert_sign(
-                ca_crt_tmp,
-                ca_key_tmp,
-                name=name,
-                ip=ip,
-                out_crt=out_crt_tmp,
-                groups=node.groups or [],
-                duration_hours=duration_hours,
-                in_pub=pub_path,
-                subnet_cidr=network.subnet_cidr,
-                allowed_roots=_roots,
-            )
-            cert_pem = out_crt_tmp.read_text()
-            private_key_pem = key_path.read_text()
-            public_key_pem = pub_path.read_text()
-
-        write_cert_store_file(base / f"{name}.crt", cert_pem)
-        key_file = base / f"{name}.key"
-        write_cert_store_file(key_file, private_key_pem)
+        cert_pem, private_key_pem, public_key_pem = await asyncio.to_thread(
+            _generate_and_sign,
+            network.ca_cert_path,
+            network.ca_key_path,
+            network.subnet_cidr,
+            node.hostname,
+            ip,
+            node.groups or [],
+            duration_hours,
+            base,
+        )
 
         node.ip_address = ip
         node.public_key = public_key_pem
         node.cert_fingerprint = None  # Can be set when device first polls
         node.status = "active"
-        await self.session.flush()
 
-        expires_at = datetime.utcnow() + timedelta(days=duration_days)
+        # Node update and certificate record are written by a single flush
+        expires_at = utcnow() + timedelta(days=duration_days)
         cert_record = Certificate(
             node_id=node.id,
             expires_at=expires_at,
@@ -256,7 +298,7 @@ class CertManager:
         ca_pem = ""
         if network.ca_cert_path:
             try:
-                ca_pem = read_cert_store_file(Path(network.ca_cert_path))
+                ca_pem = read_cert_store_file_cached(Path(network.ca_cert_path))
             except FileNotFoundError:
                 logger.warning("CA cert file not found: %s", network.ca_cert_path)
             except PermissionError:
@@ -265,3 +307,8 @@ class CertManager:
                 logger.error("Unexpected error reading CA cert from %s: %s", network.ca_cert_path, e)
 
         return ip, cert_pem, private_key_pem, ca_pem, public_key_pem
+
+
+def get_cert_manager(session: AsyncSession = Depends(get_session)) -> CertManager:
+    """FastAPI dependency: CertManager bound to the request's session."""
+    return CertManager(session)
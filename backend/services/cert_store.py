@@ -2,6 +2,9 @@
 Read/write cert store files with encryption at rest. All files under cert_store_path
 are stored encrypted (magic + Fernet).
 """
+import io
+import zipfile
+from functools import lru_cache
 from pathlib import Path
 
 from ..config import settings
@@ -9,11 +12,78 @@ from ..utils.nebula_cert import _check_path_under_roots
 from .encryption import decrypt, encrypt
 
 
+@lru_cache(maxsize=4096)
+def host_cert_paths(network_id: int, hostname: str) -> tuple[Path, Path]:
+    """(.crt, .key) paths of a node's host certificate in the cert store."""
+    hosts_dir = Path(settings.cert_store_path) / str(network_id) / "hosts"
+    return hosts_dir / f"{hostname}.crt", hosts_dir / f"{hostname}.key"
+
+
 def read_cert_store_file(path: Path) -> str:
     """Read and decrypt a cert store file; return content as string."""
+    return read_cert_store_bytes(path).decode("utf-8")
+
+
+def read_cert_store_bytes(path: Path) -> bytes:
+    """Read and decrypt a cert store file; return raw bytes (e.g. for writing into a ZIP)."""
+    safe_path = _check_path_under_roots(path, [Path(settings.cert_store_path)])
+    return decrypt(safe_path.read_bytes())
+
+
+# One entry per host cert plus one per network CA; sized for thousands of polling nodes.
+# PEM certs are ~1 KB, so a full cache stays in the low megabytes.
+_DECRYPTED_CACHE_MAXSIZE = 4096
+
+
+@lru_cache(maxsize=_DECRYPTED_CACHE_MAXSIZE)
+def _read_decrypted_cached(path_str: str, mtime_ns: int, size: int) -> str:
+    """Decrypted file content keyed by (path, mtime, size); a changed file is a new key."""
+    return decrypt(Path(path_str).read_bytes()).decode("utf-8")
+
+
+def read_cert_store_file_cached(path: Path) -> str:
+    """
+    Like read_cert_store_file, but keeps decrypted public material (CA and host certs)
+    in memory until the file changes. Private keys (.key) are never cached.
+    """
     safe_path = _check_path_under_roots(path, [Path(settings.cert_store_path)])
-    data = safe_path.read_bytes()
-    return decrypt(data).decode("utf-8")
+    if safe_path.suffix == ".key":
+        return decrypt(safe_path.read_bytes()).decode("utf-8")
+    st = safe_path.stat()
+    return _read_decrypted_cached(str(safe_path), st.st_mtime_ns, st.st_size)
+
+
+def build_certs_zip(ca_path: Path, host_cert_path: Path, host_key_path: Path) -> bytes:
+    """
+    ZIP with ca.crt, host.crt, host.key (if stored) and README.txt. Blocking file I/O and
+    decryption; async callers run it via asyncio.to_thread. Raises FileNotFoundError
+    naming the missing certificate.
+    """
+    # Open directly and map a missing file to an error instead of an exists() check before each read
+    try:
+        host_cert_content = read_cert_store_file_cached(host_cert_path)
+    except FileNotFoundError:
+        raise FileNotFoundError("Host certificate file not found") from None
+    try:
+        ca_content = read_cert_store_file_cached(ca_path)
+    except FileNotFoundError:
+        raise FileNotFoundError("CA certificate file not found") from None
+    try:
+        # Raw bytes go straight into the ZIP without a decode/encode round trip
+        host_key_content = read_cert_store_bytes(host_key_path)
+        readme = "host.key is included in this zip.\n"
+    except FileNotFoundError:
+        host_key_content = None
+        readme = "Use the host.key you saved when creating this certificate.\n"
+    buf = io.BytesIO()
+    # PEM text barely compresses; store entries instead of spending CPU on DEFLATE
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_STORED) as zf:
+        zf.writestr("ca.crt", ca_content)
+        zf.writestr("host.crt", host_cert_content)
+        if host_key_content is not None:
+            zf.writestr("host.key", host_key_content)
+        zf.writestr("README.txt", readme)
+    return buf.getvalue()
 
 
 def write_cert_store_file(path: Path, content: str) -> None:
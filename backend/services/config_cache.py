@@ -0,0 +1,103 @@
+"""
+In-process cache of rendered device configs.
+
+Rendered YAML depends on the node, its network, every peer node in that network and
+the network's group firewall rules (plus the PKI files, which callers key by mtime).
+ORM flushes that touch those rows are recorded per network and, once committed, bump
+that network's generation, so cached configs for its nodes stop matching. Callers read
+the generation before loading the rows they render, so a concurrent commit can only
+make an entry miss early, never serve stale content under the new generation.
+Cached YAML is rendered with config_generator.HOST_KEY_PLACEHOLDER in place of the host key
+(callers splice the key in per response), so decrypted private keys are never cached.
+Single-process only: generations are not shared between workers.
+"""
+from typing import Hashable, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from ..models import Network, NetworkGroupFirewall, Node
+from ..utils.ttl_cache import TTLCache
+
+# Node columns that are not part of the rendered config (heartbeat / polling bookkeeping)
+_NODE_NON_CONFIG_ATTRS = frozenset({"last_seen", "status", "first_polled_at", "device_token_version"})
+
+_CONFIG_CACHE_MAXSIZE = 10000
+_CONFIG_CACHE_TTL_SECONDS = 300
+# ETags are tiny, so they outlive the rendered YAML: a client polling with an unchanged
+# config gets its 304 without a re-render even after the YAML entry expired
+_CONFIG_ETAG_TTL_SECONDS = 24 * 60 * 60
+
+_network_generations: dict[int, int] = {}
+_config_cache = TTLCache(_CONFIG_CACHE_MAXSIZE, _CONFIG_CACHE_TTL_SECONDS)
+_config_etags = TTLCache(_CONFIG_CACHE_MAXSIZE, _CONFIG_ETAG_TTL_SECONDS)
+
+
+def network_config_generation(network_id: int) -> int:
+    """Counter bumped whenever a committed change affects configs in this network."""
+    return _network_generations.get(network_id, 0)
+
+
+def get_cached_config_etag(node_id: int, version: Hashable) -> Optional[str]:
+    """Return the ETag of the config last rendered for node_id if it was for this version."""
+    entry = _config_etags.get(node_id)
+    if entry is None or entry[0] != version:
+        return None
+    return entry[1]
+
+
+def get_cached_config(node_id: int, version: Hashable) -> Optional[tuple[str, bytes]]:
+    """
+    Return (etag, UTF-8 yaml with the host key placeholder) cached for node_id if it was
+    rendered for this version. The etag is of the YAML with the real key spliced in.
+    """
+    entry = _config_cache.get(node_id)
+    if entry is None or entry[0] != version:
+        return None
+    return entry[1], entry[2]
+
+
+def set_cached_config(node_id: int, version: Hashable, etag: str, template: bytes) -> None:
+    _config_cache.set(node_id, (version, etag, template))
+    _config_etags.set(node_id, (version, etag))
+
+
+def _affects_config(obj) -> bool:
+    if not isinstance(obj, Node):
+        return True
+    state = inspect(obj)
+    if state.deleted or state.was_deleted or state.pending or not state.has_identity:
+        return True
+    return any(
+        attr.history.has_changes()
+        for attr in state.attrs
+        if attr.key not in _NODE_NON_CONFIG_ATTRS
+    )
+
+
+def _network_id_of(obj) -> Optional[int]:
+    if isinstance(obj, Network):
+        return obj.id
+    if isinstance(obj, (Node, NetworkGroupFirewall)):
+        return obj.network_id
+    return None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_config_changes(session, flush_context) -> None:
+    changed = session.info.setdefault("config_network_ids", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        network_id = _network_id_of(obj)
+        if network_id is not None and _affects_config(obj):
+            changed.add(network_id)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_config_generations(session) -> None:
+    for network_id in session.info.pop("config_network_ids", ()):
+        _network_generations[network_id] = _network_generations.get(network_id, 0) + 1
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_config_changes(session) -> None:
+    session.info.pop("config_network_ids", None)
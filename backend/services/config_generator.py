@@ -20,6 +20,15 @@ DEFAULT_PKI_CERT = "/etc/nebula/host.crt"
 DEFAULT_PKI_KEY = "/etc/nebula/host.key"
 DEFAULT_LISTEN_PORT = 4242
 
+# libyaml's emitter when PyYAML was built with it; the pure-Python SafeDumper otherwise.
+# The config only holds plain dicts/lists/str/int/bool, so the safe dumper suffices.
+_YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
+
+# Stands in for the host key in configs that are cached; splice_host_key puts the real key
+# back per response so decrypted private keys are never held in memory (as in cert_store)
+HOST_KEY_PLACEHOLDER = "NEBULA_COMMANDER_HOST_KEY"
+
 
 def _default_pki() -> dict[str, str]:
     return {
@@ -276,7 +285,29 @@ def build_config(
     if not config["static_host_map"]:
         del config["static_host_map"]
 
-    return yaml.dump(config, default_flow_style=False, sort_keys=False, allow_unicode=True)
+    return yaml.dump(
+        config, Dumper=_YAML_DUMPER, default_flow_style=False, sort_keys=False, allow_unicode=True
+    )
+
+
+def _pki_key_yaml(key_pem: str) -> bytes:
+    """pki.key value exactly as build_config emits it (same column, quoting and line folding)."""
+    dumped = yaml.dump(
+        {"pki": {"key": key_pem.rstrip() + "\n"}},
+        Dumper=_YAML_DUMPER, default_flow_style=False, sort_keys=False, allow_unicode=True,
+    )
+    return dumped.encode("utf-8")[len(b"pki:\n  key: "):]
+
+
+_HOST_KEY_PLACEHOLDER_YAML = _pki_key_yaml(HOST_KEY_PLACEHOLDER)
+
+
+def splice_host_key(yaml_bytes: bytes, key_pem: str) -> bytes:
+    """
+    Replace HOST_KEY_PLACEHOLDER in a config rendered with inline PKI by key_pem. The result
+    is byte-identical to rendering with key_pem directly.
+    """
+    return yaml_bytes.replace(_HOST_KEY_PLACEHOLDER_YAML, _pki_key_yaml(key_pem), 1)
 
 
 async def generate_config_for_node(
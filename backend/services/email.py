@@ -1,14 +1,15 @@
 """Email service for sending invitation emails."""
+import asyncio
 import logging
 from typing import Optional
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from datetime import datetime
 
 import aiosmtplib
 from jinja2 import Environment, FileSystemLoader, select_autoescape
 
 from ..config import settings
+from ..utils.timeutils import utcnow
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +21,41 @@ jinja_env = Environment(
     autoescape=select_autoescape(['html', 'xml'])
 )
 
+_SMTP_RETRY_BASE_DELAY_SECONDS = 2
+
+
+async def _send_with_retries(message: MIMEMultipart) -> None:
+    """
+    Send via SMTP with a per-operation timeout, retrying transient failures with
+    exponential backoff. Runs after the response (BackgroundTasks), so retries never
+    hold up a request; the last error is raised to the caller.
+    """
+    attempts = max(1, settings.smtp_send_attempts)
+    for attempt in range(1, attempts + 1):
+        try:
+            await aiosmtplib.send(
+                message,
+                hostname=settings.smtp_host,
+                port=settings.smtp_port,
+                username=settings.smtp_username,
+                password=settings.smtp_password,
+                use_tls=settings.smtp_use_tls,
+                timeout=settings.smtp_timeout,
+            )
+            return
+        except (aiosmtplib.SMTPException, OSError) as e:
+            # Rejected recipients/sender will not succeed on retry
+            if attempt == attempts or isinstance(
+                e, (aiosmtplib.SMTPRecipientsRefused, aiosmtplib.SMTPSenderRefused)
+            ):
+                raise
+            delay = _SMTP_RETRY_BASE_DELAY_SECONDS * 2 ** (attempt - 1)
+            logger.warning(
+                "SMTP send to %s failed (attempt %d/%d): %s; retrying in %ds",
+                message["To"], attempt, attempts, e, delay,
+            )
+            await asyncio.sleep(delay)
+
 
 async def send_invitation_email(
     invitation_id: int,
@@ -93,14 +129,7 @@ Nebula Commander
         message.attach(MIMEText(html_content, "html"))
         
         # Send email
-        await aiosmtplib.send(
-            message,
-            hostname=settings.smtp_host,
-            port=settings.smtp_port,
-            username=settings.smtp_username,
-            password=settings.smtp_password,
-            use_tls=settings.smtp_use_tls,
-        )
+        await _send_with_retries(message)
         
         logger.info(f"Invitation email sent to {to_email}")
         
@@ -109,7 +138,7 @@ Nebula Commander
             invitation = await session.get(Invitation, invitation_id)
             if invitation:
                 invitation.email_status = "sent"
-                invitation.email_sent_at = datetime.utcnow()
+                invitation.email_sent_at = utcnow()
                 invitation.email_error = None
                 await session.commit()
         
@@ -3,6 +3,7 @@ Encryption at rest: Fernet (symmetric, authenticated) with a version magic prefi
 Used for sensitive DB columns and cert store files. Key is required at startup.
 """
 import base64
+import hashlib
 import logging
 from typing import Optional
 
@@ -32,6 +33,22 @@ def _get_fernet() -> Fernet:
     return _fernet
 
 
+def _get_key_bytes() -> bytes:
+    _get_fernet()  # raises if the key was not loaded
+    key = settings._encryption_key
+    return key.encode() if isinstance(key, str) else key
+
+
+def enrollment_code_digest(code: str) -> str:
+    """
+    Stored form of an enrollment code: BLAKE2b keyed with the encryption key, hex.
+    A database dump alone is not enough to brute-force outstanding codes.
+    """
+    return hashlib.blake2b(
+        code.encode("utf-8"), digest_size=32, key=_get_key_bytes(), person=b"nc-enroll-code"
+    ).hexdigest()
+
+
 def encrypt(plaintext: str | bytes) -> bytes:
     """Encrypt plaintext; return magic + Fernet token (bytes)."""
     if isinstance(plaintext, str):
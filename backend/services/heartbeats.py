@@ -0,0 +1,78 @@
+"""
+Coalesced node heartbeats. Handlers record the latest time each node was seen; a
+background task writes all pending heartbeats in one bulk UPDATE per interval instead
+of one write transaction per request.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime
+
+from sqlalchemy import bindparam, update
+
+from ..database import AsyncSessionLocal
+from ..models import Node
+
+logger = logging.getLogger(__name__)
+
+_HEARTBEAT_FLUSH_INTERVAL_SECONDS = 1.0
+
+# node_id -> last_seen, replaced wholesale on each flush
+_pending: dict[int, datetime] = {}
+
+# Core statement (not ORM bulk-by-primary-key) so rows deleted since the heartbeat are
+# simply not matched; bind names must differ from the column names
+_nodes = Node.__table__
+_HEARTBEAT_UPDATE = (
+    update(_nodes)
+    .where(_nodes.c.id == bindparam("b_node_id"))
+    .values(last_seen=bindparam("b_last_seen"), status="active")
+)
+
+
+def record_heartbeat(node_id: int, seen_at: datetime) -> None:
+    """Mark node as seen at seen_at; written to the database on the next flush."""
+    _pending[node_id] = seen_at
+
+
+async def _flush_heartbeats() -> None:
+    global _pending
+    if not _pending:
+        return
+    batch, _pending = _pending, {}
+    rows = [{"b_node_id": node_id, "b_last_seen": seen_at} for node_id, seen_at in batch.items()]
+    try:
+        async with AsyncSessionLocal() as session:
+            # One executemany for the whole batch
+            await session.execute(_HEARTBEAT_UPDATE, rows)
+            await session.commit()
+    except Exception:
+        logger.exception("Failed to write %d node heartbeats", len(rows))
+
+
+async def _heartbeat_writer(stop: asyncio.Event) -> None:
+    """Flush pending heartbeats every interval until stop is set, then flush once more."""
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), _HEARTBEAT_FLUSH_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        await _flush_heartbeats()
+
+
+async def start_heartbeat_writer(app) -> None:
+    """Start the background task that writes coalesced heartbeats."""
+    app.state.heartbeat_writer_stop = asyncio.Event()
+    app.state.heartbeat_writer_task = asyncio.create_task(
+        _heartbeat_writer(app.state.heartbeat_writer_stop)
+    )
+
+
+async def stop_heartbeat_writer(app) -> None:
+    """Write heartbeats still pending, then stop the background writer."""
+    task = getattr(app.state, "heartbeat_writer_task", None)
+    if task is None:
+        return
+    app.state.heartbeat_writer_stop.set()
+    await task
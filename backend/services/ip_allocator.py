@@ -6,12 +6,17 @@ import logging
 from typing import Optional
 
 from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ..models import AllocatedIP, Network
 
 logger = logging.getLogger(__name__)
 
+# Dialects with INSERT ... ON CONFLICT DO NOTHING; others fall back to check-then-insert
+_CONFLICT_INSERTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+
 
 class IPAllocator:
     """Allocate IPs from a network subnet, avoiding already-allocated IPs."""
@@ -37,22 +42,9 @@ class IPAllocator:
             try:
                 ip = ipaddress.ip_address(suggested_ip)
                 if ip in net and ip not in (net.network_address, net.broadcast_address):
-                    # Check if already allocated
-                    existing = await self.session.execute(
-                        select(AllocatedIP).where(
-                            AllocatedIP.network_id == network_id,
-                            AllocatedIP.ip_address == suggested_ip,
-                        )
-                    )
-                    if existing.scalar_one_or_none() is None:
-                        alloc = AllocatedIP(
-                            network_id=network_id,
-                            ip_address=suggested_ip,
-                        )
-                        self.session.add(alloc)
-                        await self.session.flush()
+                    if await self._claim(network_id, suggested_ip):
                         return suggested_ip
-                    # Fall through to auto-allocate
+                    # Already allocated: fall through to auto-allocate
             except ValueError:
                 pass
 
@@ -64,17 +56,33 @@ class IPAllocator:
 
         for ip in hosts:
             addr = str(ip)
-            if addr not in used:
-                alloc = AllocatedIP(
-                    network_id=network_id,
-                    ip_address=addr,
-                )
-                self.session.add(alloc)
-                await self.session.flush()
+            # A concurrent request may claim the same address first; try the next one
+            if addr not in used and await self._claim(network_id, addr):
                 return addr
 
         raise ValueError(f"No free IP in subnet {subnet_cidr}")
 
+    async def _claim(self, network_id: int, ip_address: str) -> bool:
+        """
+        Record ip_address as allocated. Returns False if it already is. Where the dialect
+        supports it this is one INSERT ... ON CONFLICT DO NOTHING against
+        uq_allocated_ip_network_ip, so two requests cannot claim the same address.
+        """
+        conflict_insert = _CONFLICT_INSERTS.get(self.session.get_bind().dialect.name)
+        if conflict_insert is None:
+            if await self.is_allocated(network_id, ip_address):
+                return False
+            self.session.add(AllocatedIP(network_id=network_id, ip_address=ip_address))
+            await self.session.flush()
+            return True
+        result = await self.session.execute(
+            conflict_insert(AllocatedIP)
+            .values(network_id=network_id, ip_address=ip_address)
+            .on_conflict_do_nothing()
+            .returning(AllocatedIP.id)
+        )
+        return result.scalar_one_or_none() is not None
+
     async def release(self, network_id: int, ip_address: str) -> None:
         """Release an allocated IP."""
         result = await self.session.execute(
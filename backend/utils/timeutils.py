@@ -0,0 +1,20 @@
+"""
+UTC time helpers. Database datetime columns are naive UTC, so these return naive values.
+"""
+from datetime import datetime, timezone
+
+from starlette.requests import Request
+
+
+def utcnow() -> datetime:
+    """Current time as a naive UTC datetime (replacement for deprecated datetime.utcnow())."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def request_now(request: Request) -> datetime:
+    """Naive UTC time taken once per request and cached on request.state."""
+    now = getattr(request.state, "now", None)
+    if now is None:
+        now = utcnow()
+        request.state.now = now
+    return now
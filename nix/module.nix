@@ -16,8 +16,9 @@ let
     pydantic
     pydantic-settings
     email-validator
+    orjson
     pyyaml
-    python-jose
+    pyjwt
     httpx
     authlib
     itsdangerous
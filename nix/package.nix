@@ -17,8 +17,9 @@ let
     pydantic
     pydantic-settings
     email-validator
+    orjson
     pyyaml
-    python-jose
+    pyjwt
     httpx
     authlib
     itsdangerous